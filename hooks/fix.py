@@ -3,6 +3,19 @@
 import numpy as np
 import math
 import random
+from collections import OrderedDict
+from time import perf_counter_ns
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 # Store game state in parent's storage
 if not hasattr(parent(), 'storage'):
@@ -23,7 +36,10 @@ if 'gameState' not in storage:
         'safeZoneLocations': [],  # Track safe zone locations for exposure
         'detectedCircles': [],  # Track all detected circles from input
         'circleCollisions': {},  # Track collision state for each circle
-        'totalCirclesDetected': 0
+        'totalCirclesDetected': 0,
+        'tracks': [],  # Persistent blob tracks with stable ids
+        'nextTrackId': 1,
+        'framesSinceRescan': 0
     }
 
 def onSetupParameters(scriptOp):
@@ -39,7 +55,13 @@ def onSetupParameters(scriptOp):
     p = page.appendInt('Resolution', label='Output Resolution')
     p.default = 256
     p.min = 64
-    p.max = 1024
+    p.max = 2048
+    
+    # Match the Script TOP's pixel format - uint8 is all the LED hardware takes
+    p = page.appendMenu('Outputformat', label='Output Pixel Format')
+    p.menuNames = ['float32', 'float16', 'uint8']
+    p.menuLabels = ['32-bit Float', '16-bit Float', '8-bit Fixed']
+    p.default = 'float32'
     
     # Lava Scanners
     page2 = scriptOp.appendCustomPage('Lava Scanners')
@@ -67,6 +89,12 @@ def onSetupParameters(scriptOp):
     p = page2.appendToggle('Scanpulse', label='Pulse Effect')
     p.default = True
     
+    # Lava is smooth at the scale of Scannerwidth - render it coarser and upsample
+    p = page2.appendMenu('Lavaresolution', label='Lava Field Resolution')
+    p.menuNames = ['full', 'auto', '2', '4', '8']
+    p.menuLabels = ['Full', 'Auto (from Scanner Width)', '1/2', '1/4', '1/8']
+    p.default = 'full'
+    
     # Safe Platforms
     page3 = scriptOp.appendCustomPage('Safe Zones')
     
@@ -133,7 +161,7 @@ def onSetupParameters(scriptOp):
     p = page6.appendInt('Numplayers', label='Number of Players')
     p.default = 4
     p.min = 1
-    p.max = 8
+    p.max = 5000
     
     p = page6.appendInt('Numcolors', label='Number of Colors')
     p.default = 4
@@ -175,9 +203,106 @@ def onSetupParameters(scriptOp):
     p.min = 1
     p.max = 100
     
+    p = page7.appendInt('Pyramidlevel', label='Detection Pyramid Level')
+    p.default = 2
+    p.min = 0
+    p.max = 3
+    
+    p = page7.appendMenu('Pyramidpool', label='Pyramid Pooling')
+    p.menuNames = ['max', 'sample']
+    p.menuLabels = ['Block Max (exact)', 'Point Sample (fastest)']
+    p.default = 'max'
+    
+    p = page7.appendToggle('Tracking', label='Track Blobs (Stable IDs)')
+    p.default = True
+    
+    p = page7.appendInt('Rescaninterval', label='Full Rescan Every (cooks)')
+    p.default = 15
+    p.min = 1
+    p.max = 300
+    
+    p = page7.appendToggle('Detectasync', label='Detect in Background Thread')
+    p.default = False
+    
+    p = page7.appendFloat('Detectionage', label='Detection Age (ms)')
+    p.readOnly = True
+    p.default = 0.0
+    
     p = page7.appendToggle('Debugmode', label='Debug Visualization')
     p.default = False
     
+    # === EXPORT PAGE ===
+    page9 = scriptOp.appendCustomPage('Export')
+    
+    p = page9.appendDAT('Safezonetable', label='Safe Zone Table DAT')
+    
+    p = page9.appendDAT('Circletable', label='Circle Table DAT')
+    
+    p = page9.appendToggle('Exportshm', label='Shared Memory Export')
+    p.default = False
+    
+    p = page9.appendStr('Exportprefix', label='Shared Memory Name Prefix')
+    p.default = 'ledgame'
+    
+    p = page9.appendToggle('Legacystrings', label='Write Legacy String Parameters')
+    p.default = True
+    
+    # === PERFORMANCE PAGE ===
+    page8 = scriptOp.appendCustomPage('Performance')
+    
+    p = page8.appendToggle('Profile', label='Profile Cook Stages')
+    p.default = False
+    
+    p = page8.appendDAT('Profiletable', label='Profile Table DAT (optional)')
+    
+    p = page8.appendToggle('Autoquality', label='Auto Quality (Frame Budget)')
+    p.default = False
+    
+    p = page8.appendFloat('Framebudget', label='Frame Budget (ms)')
+    p.default = 16.6
+    p.min = 4.0
+    p.max = 100.0
+    
+    p = page8.appendInt('Qualitytier', label='Active Quality Tier')
+    p.readOnly = True
+    p.default = 0
+    
+    p = page8.appendStr('Qualitylabel', label='Active Quality')
+    p.readOnly = True
+    p.default = QUALITY_TIERS[0]['label']
+    
+    p = page8.appendInt('Tileworkers', label='Tile Worker Processes (0 = off)')
+    p.default = 0
+    p.min = 0
+    p.max = 16
+    
+    p = page8.appendStr('Tilepanels', label='Panel Heights (e.g. 1,1,2)')
+    p.default = ''
+    
+    p = page8.appendStr('Tilepython', label='Worker Python Executable')
+    p.default = ''
+    
+    p = page8.appendMenu('Kernels', label='Kernel Backend')
+    p.menuNames = ['auto', 'numpy']
+    p.menuLabels = ['Numba if Installed', 'NumPy Only']
+    p.default = 'auto'
+    
+    p = page8.appendStr('Kernelbackend', label='Active Kernel Backend')
+    p.readOnly = True
+    p.default = 'numpy'
+    
+    for stage, label in PROFILE_STAGES + (('total', 'Total'),):
+        p = page8.appendFloat(f'Perf{stage}mean', label=f'{label} Mean (ms)')
+        p.readOnly = True
+        p.default = 0.0
+        
+        p = page8.appendFloat(f'Perf{stage}p95', label=f'{label} P95 (ms)')
+        p.readOnly = True
+        p.default = 0.0
+    
+    # Compile the JIT kernels now rather than on the first game frame
+    useKernels(scriptOp, scriptOp.par.Kernels.eval())
+    
     return
 
 def onPulse(par):
@@ -192,33 +317,26 @@ def initGame(scriptOp):
     storage['gameState']['isRunning'] = True
     storage['gameState']['lastTime'] = absTime.seconds
     
-    try:
-        numPlayers = scriptOp.par.Numplayers.eval()
-        colorChangeTime = scriptOp.par.Colorchangetime.eval()
-        numColors = scriptOp.par.Numcolors.eval()
-    except:
-        numPlayers = 4
-        colorChangeTime = 10.0
-        numColors = 4
+    # Starting always picks up the current player and colour settings
+    storage['paramsDirty'] = True
+    params = getParams(scriptOp)
+    numPlayers = params.num_players
+    colorChangeTime = params.color_change_time
+    numColors = params.num_colors
     
     storage['gameState']['timeUntilChange'] = colorChangeTime
     storage['gameState']['currentDangerColor'] = int(absTime.seconds * 1000) % numColors
     
     # Initialize players with random positions
-    storage['gameState']['players'] = {}
-    for i in range(numPlayers):
-        storage['gameState']['players'][i] = {
-            'position': [np.random.random(), np.random.random()],
-            'color': i % numColors,
-            'score': 0,
-            'isAlive': True,
-            'velocity': [np.random.random() * 0.02 - 0.01, np.random.random() * 0.02 - 0.01]
-        }
+    storage['gameState']['players'] = createPlayers(numPlayers, numColors)
     
     print(f"Game Started! {numPlayers} players, Danger color: {storage['gameState']['currentDangerColor']}")
 
 def resetGame(scriptOp):
     """Reset the game"""
+    # A detection in flight would otherwise carry the old tracks past the reset
+    stopDetectionWorker()
+    
     storage['gameState']['isRunning'] = False
     storage['gameState']['currentDangerColor'] = 0
     storage['gameState']['timeUntilChange'] = 10.0
@@ -228,22 +346,652 @@ def resetGame(scriptOp):
     storage['gameState']['detectedCircles'] = []
     storage['gameState']['circleCollisions'] = {}
     storage['gameState']['totalCirclesDetected'] = 0
+    storage['gameState']['tracks'] = []
+    storage['gameState']['nextTrackId'] = 1
+    storage['gameState']['framesSinceRescan'] = 0
     print("Game Reset")
 
-def detectMultipleCircles(scriptOp, tex_size):
-    """Detect multiple white circles/players from input 0 with exact pixel mapping - NO SCIPY"""
+# === PARAMETER SNAPSHOT ===
+# Every parameter onCook needs, read into one slotted object kept in storage.
+# It is re-read only after a change sets storage['paramsDirty'], or every
+# PARAM_POLL_INTERVAL cooks in case nothing does. Script TOP callbacks never
+# hear about parameter edits, so fix_parexec.py holds the Parameter Execute
+# DAT callbacks that set the flag - wired up, edits apply on the next cook.
+# A bad parameter falls back to its own default without affecting the others.
+PARAM_SPECS = (
+    # attribute, parameter, type, default
+    ('game_speed', 'Gamespeed', float, 1.0),
+    ('resolution', 'Resolution', int, 256),
+    ('output_format', 'Outputformat', str, 'float32'),
+    ('num_h_scanners', 'Numhscanners', int, 2),
+    ('num_v_scanners', 'Numvscanners', int, 2),
+    ('scanner_width', 'Scannerwidth', int, 30),
+    ('lava_resolution', 'Lavaresolution', str, 'full'),
+    ('scan_speed', 'Scanspeed', float, 1.0),
+    ('scan_pulse', 'Scanpulse', bool, True),
+    ('num_safe_zones', 'Numsafezones', int, 8),
+    ('safe_size', 'Safesize', int, 40),
+    ('safe_move', 'Safemove', bool, True),
+    ('diagonal_scan', 'Diagonalscan', bool, True),
+    ('circular_scan', 'Circularscan', bool, True),
+    ('burst_count', 'Burstcount', int, 3),
+    ('lava_r', 'Lavar', float, 1.0),
+    ('lava_g', 'Lavag', float, 0.2),
+    ('lava_b', 'Lavab', float, 0.0),
+    ('num_players', 'Numplayers', int, 4),
+    ('num_colors', 'Numcolors', int, 4),
+    ('color_change_time', 'Colorchangetime', float, 10.0),
+    ('collision_threshold', 'Collisionthreshold', float, 0.3),
+    ('detection_threshold', 'Detectionthreshold', float, 0.8),
+    ('min_blob_size', 'Minblobsize', int, 10),
+    ('pyramid_level', 'Pyramidlevel', int, 2),
+    ('pyramid_pool', 'Pyramidpool', str, 'max'),
+    ('tracking', 'Tracking', bool, True),
+    ('rescan_interval', 'Rescaninterval', int, 15),
+    ('detect_async', 'Detectasync', bool, False),
+    ('debug_mode', 'Debugmode', bool, False),
+    ('profile', 'Profile', bool, False),
+    ('auto_quality', 'Autoquality', bool, False),
+    ('frame_budget', 'Framebudget', float, 16.6),
+    ('tile_workers', 'Tileworkers', int, 0),
+    ('tile_panels', 'Tilepanels', str, ''),
+    ('tile_python', 'Tilepython', str, ''),
+    ('kernels', 'Kernels', str, 'auto'),
+    ('export_shm', 'Exportshm', bool, False),
+    ('export_prefix', 'Exportprefix', str, 'ledgame'),
+    ('legacy_strings', 'Legacystrings', bool, True),
+)
+PARAM_POLL_INTERVAL = 30
+
+# Storage caches dropped when a field they depend on changes
+PARAM_DEPENDENTS = {
+    'resolution': ('geometry', 'frameBuffers', 'layers'),
+    'scanner_width': ('falloffTables',),
+    'detect_async': ('detectionWorkerFailed',),
+    'tile_workers': ('tilePool', 'tilesFailed'),
+    'tile_python': ('tilePool', 'tilesFailed'),
+    'export_shm': ('exports', 'exportBlocks'),
+    'export_prefix': ('exports', 'exportBlocks'),
+    'legacy_strings': ('exports',),
+}
+
+class Params:
+    """Snapshot of the cook-time parameters, one slot per PARAM_SPECS entry"""
+    __slots__ = tuple(spec[0] for spec in PARAM_SPECS)
+
+def readParams(scriptOp):
+    """Evaluate every parameter, each falling back to its own default"""
+    params = Params()
+    for attr, name, kind, default in PARAM_SPECS:
+        try:
+            value = kind(getattr(scriptOp.par, name).eval())
+        except:
+            value = default
+        setattr(params, attr, value)
+    return params
+
+def getParams(scriptOp):
+    """Current parameter snapshot, re-read only when a parameter may have changed"""
+    params = storage.get('params')
+    age = storage.get('paramsAge', 0) + 1
+    fresh = isinstance(params, Params) and not storage.get('paramsDirty') and age < PARAM_POLL_INTERVAL
+    if fresh:
+        storage['paramsAge'] = age
+        return params
+    
+    latest = readParams(scriptOp)
+    if isinstance(params, Params):
+        changed = [attr for attr in Params.__slots__ if getattr(params, attr) != getattr(latest, attr)]
+    else:
+        changed = list(Params.__slots__)
+    
+    for attr in changed:
+        for key in PARAM_DEPENDENTS.get(attr, ()):
+            dropped = storage.pop(key, None)
+            if dropped is not None and key in CACHE_RELEASERS:
+                CACHE_RELEASERS[key](dropped)
+    
+    storage['params'] = latest
+    storage['paramsDirty'] = False
+    storage['paramsAge'] = 0
+    return latest
+
+# === PROFILER ===
+# Per-stage cook timings in a ring buffer of the last PROFILE_WINDOW cooks,
+# published as rolling mean / p95 on the Performance page. With Profile off
+# onCook never reads the clock; each stage check is a single None test.
+PROFILE_STAGES = (
+    ('params', 'Parameter Read'),
+    ('game', 'Game Update'),
+    ('scanners', 'Scanners + Hit Tests'),
+    ('render', 'Lava + Base Render'),
+    ('detection', 'Circle Detection'),
+    ('collisions', 'Circle Collisions'),
+    ('sprites', 'Sprite Drawing'),
+    ('output', 'copyNumpyArray'),
+)
+PROFILE_STAGE_INDEX = {stage: i for i, (stage, label) in enumerate(PROFILE_STAGES)}
+PROFILE_WINDOW = 120
+PROFILE_PUBLISH_INTERVAL = 15  # Cooks between updates of the Performance page
+
+def startProfile(params):
+    """Profiler state for this cook, or None when profiling is off
+    
+    Decided from the previous cook's parameter snapshot so the parameter
+    read itself can be timed; toggling Profile takes effect one cook later.
+    """
+    if params is None or not getattr(params, 'profile', False):
+        return None
+    
+    profile = storage.get('profile')
+    if profile is None:
+        profile = {
+            'samples': np.zeros((len(PROFILE_STAGES), PROFILE_WINDOW), dtype=np.int64),
+            'index': 0,
+            'count': 0
+        }
+        storage['profile'] = profile
+    
+    # A stage skipped this cook records 0 rather than a stale sample
+    profile['samples'][:, profile['index']] = 0
+    profile['last'] = perf_counter_ns()
+    return profile
+
+def profileLap(profile, stage):
+    """Charge the time since the previous lap to stage"""
+    now = perf_counter_ns()
+    profile['samples'][PROFILE_STAGE_INDEX[stage], profile['index']] += now - profile['last']
+    profile['last'] = now
+
+def finishProfile(profile, scriptOp):
+    """Advance the ring buffer and publish the rolling stats every PROFILE_PUBLISH_INTERVAL cooks"""
+    profile['index'] = (profile['index'] + 1) % PROFILE_WINDOW
+    profile['count'] += 1
+    if profile['count'] % PROFILE_PUBLISH_INTERVAL == 0:
+        publishProfile(profile, scriptOp)
+
+def profileStats(profile):
+    """Rolling (stage, mean ms, p95 ms, max ms) rows over the filled part of the window, plus a total row"""
+    filled = min(profile['count'], PROFILE_WINDOW)
+    samples = profile['samples'][:, :filled] / 1e6
+    samples = np.vstack([samples, samples.sum(axis=0)])
+    
+    stages = [stage for stage, label in PROFILE_STAGES] + ['total']
+    means = samples.mean(axis=1)
+    p95s = np.percentile(samples, 95, axis=1)
+    peaks = samples.max(axis=1)
+    return list(zip(stages, means, p95s, peaks))
+
+def publishProfile(profile, scriptOp):
+    """Write the rolling stats to the Performance page and the optional Table DAT"""
+    stats = profileStats(profile)
+    try:
+        for stage, mean, p95, peak in stats:
+            setattr(scriptOp.par, f'Perf{stage}mean', round(float(mean), 3))
+            setattr(scriptOp.par, f'Perf{stage}p95', round(float(p95), 3))
+    except:
+        pass
+    
+    try:
+        table = scriptOp.par.Profiletable.eval()
+    except:
+        table = None
+    if table:
+        table.clear()
+        table.appendRow(['stage', 'mean_ms', 'p95_ms', 'max_ms'])
+        for stage, mean, p95, peak in stats:
+            table.appendRow([stage, f'{mean:.3f}', f'{p95:.3f}', f'{peak:.3f}'])
+
+# === QUALITY GOVERNOR ===
+# With Autoquality on, the smoothed cook time is held against Framebudget and
+# internal work steps along QUALITY_TIERS - output size stays at Resolution,
+# and sprites keep their size and falloff at every tier.
+# Dropping a tier takes QUALITY_DOWN_COOKS over-budget cooks in a row, climbing
+# back takes QUALITY_UP_COOKS cooks under QUALITY_HEADROOM of the budget, and
+# every change is followed by QUALITY_HOLD_COOKS without one, so it settles
+# instead of oscillating between two tiers.
+QUALITY_TIERS = (
+    {'label': 'Full', 'lava_scale': 1, 'diagonal': True, 'circular': True, 'bursts': True,
+     'pyramid_boost': 0},
+    {'label': 'Coarse detection', 'lava_scale': 1, 'diagonal': True, 'circular': True, 'bursts': True,
+     'pyramid_boost': 1},
+    {'label': 'Half-res lava', 'lava_scale': 2, 'diagonal': True, 'circular': True, 'bursts': True,
+     'pyramid_boost': 1},
+    {'label': 'No bursts', 'lava_scale': 2, 'diagonal': True, 'circular': True, 'bursts': False,
+     'pyramid_boost': 1},
+    {'label': 'Quarter-res lava', 'lava_scale': 4, 'diagonal': True, 'circular': False, 'bursts': False,
+     'pyramid_boost': 2},
+    {'label': 'Minimal', 'lava_scale': 4, 'diagonal': False, 'circular': False, 'bursts': False,
+     'pyramid_boost': 2},
+)
+QUALITY_SMOOTHING = 0.1  # Weight of the newest cook in the smoothed cook time
+QUALITY_HEADROOM = 0.6
+QUALITY_DOWN_COOKS = 15
+QUALITY_UP_COOKS = 120
+QUALITY_HOLD_COOKS = 60
+QUALITY_MAX_PYRAMID_LEVEL = 3
+
+def getQuality(params):
+    """Settings of the active quality tier - always the top tier with Autoquality off"""
+    governor = storage.get('governor')
+    if not params.auto_quality or governor is None:
+        return QUALITY_TIERS[0]
+    return QUALITY_TIERS[governor['tier']]
+
+def updateGovernor(scriptOp, cook_ms, budget_ms):
+    """Fold one cook time into the governor and step the tier when the hysteresis allows"""
+    governor = storage.get('governor')
+    if governor is None:
+        governor = {'tier': 0, 'smoothed': cook_ms, 'over': 0, 'under': 0, 'hold': 0}
+        storage['governor'] = governor
+    
+    governor['smoothed'] += QUALITY_SMOOTHING * (cook_ms - governor['smoothed'])
+    if governor['hold'] > 0:
+        governor['hold'] -= 1
+        return
+    
+    governor['over'] = governor['over'] + 1 if governor['smoothed'] > budget_ms else 0
+    governor['under'] = governor['under'] + 1 if governor['smoothed'] < budget_ms * QUALITY_HEADROOM else 0
+    
+    tier = governor['tier']
+    if governor['over'] >= QUALITY_DOWN_COOKS and tier < len(QUALITY_TIERS) - 1:
+        tier += 1
+    elif governor['under'] >= QUALITY_UP_COOKS and tier > 0:
+        tier -= 1
+    else:
+        return
+    
+    governor.update(tier=tier, over=0, under=0, hold=QUALITY_HOLD_COOKS)
+    publishQualityTier(scriptOp, tier)
+    print(f"🎚️ Quality tier {tier}: {QUALITY_TIERS[tier]['label']} ({governor['smoothed']:.1f} ms smoothed)")
+
+def resetGovernor(scriptOp):
+    """Back to full quality when Autoquality is switched off"""
+    if storage.pop('governor', None) is not None:
+        publishQualityTier(scriptOp, 0)
+
+def publishQualityTier(scriptOp, tier):
+    try:
+        scriptOp.par.Qualitytier = tier
+        scriptOp.par.Qualitylabel = QUALITY_TIERS[tier]['label']
+    except:
+        pass
+
+def toGrayscale(pixels):
+    """Average the RGB channels of an input frame (plain channel adds, no strided mean)"""
+    if len(pixels.shape) < 3:
+        return pixels
+    if pixels.shape[2] < 3:
+        return np.mean(pixels, axis=2)
+    
+    gray = pixels[:, :, 0].astype(np.float32)
+    gray += pixels[:, :, 1]
+    gray += pixels[:, :, 2]
+    gray /= 3
+    return gray
+
+def encodeRuns(binary):
+    """Run-length encode every row of a binary image as (row, start, end) arrays"""
+    height, width = binary.shape
+    
+    # A zero sentinel column ends every row, so runs never wrap onto the next row
+    stride = width + 1
+    padded = np.zeros((height, stride), dtype=np.int8)
+    padded[:, :width] = binary
+    
+    # Value changes alternate start/end in raster order
+    changes = np.flatnonzero(np.diff(padded.ravel(), prepend=np.int8(0)))
+    run_starts = changes[0::2]
+    run_ends = changes[1::2]
+    
+    rows = run_starts // stride
+    starts = run_starts - rows * stride
+    ends = run_ends - rows * stride
+    return rows, starts, ends
+
+def linkRuns(rows, starts, ends, width):
+    """Find (upper, lower) pairs of runs on adjacent rows that touch (4-connectivity)"""
+    stride = width + 1
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    
+    # Runs of the previous row overlapping each run form one contiguous range
+    prev_row = (rows - 1) * stride
+    lo = np.searchsorted(end_keys, prev_row + starts, side='right')
+    hi = np.searchsorted(start_keys, prev_row + ends, side='left')
+    
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    lower = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    upper = np.repeat(lo, counts) + offsets
+    return upper, lower
+
+def unionRuns(num_runs, upper, lower):
+    """Vectorized union-find: label every run with the lowest run index in its blob"""
+    labels = np.arange(num_runs)
+    
+    while len(upper):
+        root_a = labels[upper]
+        root_b = labels[lower]
+        differ = root_a != root_b
+        if not differ.any():
+            break
+        
+        # Linked runs stay linked, so only unresolved pairs are carried forward
+        upper = upper[differ]
+        lower = lower[differ]
+        root_a = root_a[differ]
+        root_b = root_b[differ]
+        
+        # Hook the higher root under the lower one, then flatten to roots
+        np.minimum.at(labels, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    
+    return labels
+
+def labelBlobs(binary):
+    """Label 4-connected blobs of a binary image - run length encoding + union-find, NO SCIPY
+    
+    Blobs are ordered by their first pixel in raster order. Cost grows with the
+    number of white runs rather than the number of white pixels. Returns per-blob
+    arrays: size, center_x/center_y, inclusive top/bottom/left/right bounds and
+    first_x (column of the first pixel on the top row).
+    """
+    rows, starts, ends = encodeRuns(binary)
+    num_runs = len(rows)
+    if num_runs == 0:
+        return emptyBlobs()
+    
+    upper, lower = linkRuns(rows, starts, ends, binary.shape[1])
+    union = KERNELS.get('unionRuns', unionRuns)
+    labels = union(num_runs, upper, lower)
+    
+    # Roots are the first run of each blob, so sorted roots give raster order
+    roots, component = np.unique(labels, return_inverse=True)
+    lengths = ends - starts
+    size = np.bincount(component, weights=lengths)
+    sum_x = np.bincount(component, weights=(starts + ends - 1) * lengths / 2.0)
+    sum_y = np.bincount(component, weights=rows * lengths)
+    
+    num_blobs = len(roots)
+    bottom = np.zeros(num_blobs, dtype=rows.dtype)
+    left = np.full(num_blobs, binary.shape[1], dtype=starts.dtype)
+    right = np.zeros(num_blobs, dtype=ends.dtype)
+    np.maximum.at(bottom, component, rows)
+    np.minimum.at(left, component, starts)
+    np.maximum.at(right, component, ends - 1)
+    
+    return {
+        'size': size,
+        'center_x': sum_x / size,
+        'center_y': sum_y / size,
+        'top': rows[roots],
+        'bottom': bottom,
+        'left': left,
+        'right': right,
+        'first_x': starts[roots]
+    }
+
+BLOB_KEYS = ('size', 'center_x', 'center_y', 'top', 'bottom', 'left', 'right', 'first_x')
+
+def emptyBlobs():
+    """Blob statistics with no blobs"""
+    return {key: np.zeros(0) for key in BLOB_KEYS}
+
+def offsetBlobs(blobs, dx, dy):
+    """Shift blob statistics found inside a region back to frame coordinates"""
+    shifted = dict(blobs)
+    for key in ('center_x', 'left', 'right', 'first_x'):
+        shifted[key] = blobs[key] + dx
+    for key in ('center_y', 'top', 'bottom'):
+        shifted[key] = blobs[key] + dy
+    return shifted
+
+# === DETECTION PYRAMID ===
+# Coarse candidates are found on a block-reduced copy of the input, then every
+# candidate is labeled again at full resolution inside its own region only.
+PYRAMID_MAX_PASSES = 4
+
+def poolBlocks(pixels, factor):
+    """Max-pool a frame over factor x factor blocks, keeping partial edge blocks"""
+    pooled_rows = pixels[0::factor].copy()
+    for i in range(1, factor):
+        part = pixels[i::factor]
+        np.maximum(pooled_rows[:len(part)], part, out=pooled_rows[:len(part)])
+    
+    pooled = pooled_rows[:, 0::factor].copy()
+    for i in range(1, factor):
+        part = pooled_rows[:, i::factor]
+        cols = part.shape[1]
+        np.maximum(pooled[:, :cols], part, out=pooled[:, :cols])
+    return pooled
+
+def mergeRegions(regions):
+    """Union overlapping (y0, y1, x0, x1) regions until all of them are disjoint"""
+    merged = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        disjoint = []
+        for region in merged:
+            for i, other in enumerate(disjoint):
+                if (region[0] < other[1] and other[0] < region[1] and
+                        region[2] < other[3] and other[2] < region[3]):
+                    disjoint[i] = (min(region[0], other[0]), max(region[1], other[1]),
+                                   min(region[2], other[2]), max(region[3], other[3]))
+                    changed = True
+                    break
+            else:
+                disjoint.append(region)
+        merged = disjoint
+    return merged
+
+def labelRegions(pixels, threshold, regions):
+    """Label blobs inside several (y0, y1, x0, x1) regions of the frame in one pass
+    
+    The thresholded regions are stacked into a single mosaic separated by empty
+    rows, so the labeling cost does not grow with the number of regions.
+    Returns the blobs of every region in frame coordinates and raster order,
+    plus a per-region flag telling whether a blob is cut by a region edge that
+    is not also a frame edge. Blobs of cut regions are left out.
+    """
+    height, width = pixels.shape[:2]
+    if not regions:
+        return emptyBlobs(), np.zeros(0, dtype=bool)
+    
+    bounds = np.array(regions).reshape(-1, 4)
+    y0, y1, x0, x1 = bounds.T
+    row_starts = np.concatenate(([0], np.cumsum(y1 - y0 + 1)[:-1]))
+    
+    mosaic = np.zeros((int(row_starts[-1] + y1[-1] - y0[-1]), int((x1 - x0).max())), dtype=bool)
+    for start, (ry0, ry1, rx0, rx1) in zip(row_starts, regions):
+        mosaic[start:start + ry1 - ry0, :rx1 - rx0] = toGrayscale(pixels[ry0:ry1, rx0:rx1]) > threshold
+    
+    blobs = labelBlobs(mosaic)
+    region = np.searchsorted(row_starts, blobs['top'], side='right') - 1
+    top = blobs['top'] - row_starts[region]
+    bottom = blobs['bottom'] - row_starts[region]
+    
+    cut = (((top == 0) & (y0[region] > 0)) |
+           ((bottom == (y1 - y0 - 1)[region]) & (y1[region] < height)) |
+           ((blobs['left'] == 0) & (x0[region] > 0)) |
+           ((blobs['right'] == (x1 - x0 - 1)[region]) & (x1[region] < width)))
+    region_cut = np.zeros(len(regions), dtype=bool)
+    region_cut[region[cut]] = True
+    
+    keep = ~region_cut[region]
+    shifted = offsetBlobs(blobs, x0[region], (y0 - row_starts)[region])
+    found = {key: values[keep] for key, values in shifted.items()}
+    order = np.lexsort((found['first_x'], found['top']))
+    return {key: values[order] for key, values in found.items()}, region_cut
+
+def detectBlobsPyramid(pixels, threshold, factor, pool='max'):
+    """Find blobs on a factor-reduced copy of the frame, then refine them in full-res regions
+    
+    'max' pooling keeps every block that holds a white pixel, so the result is
+    identical to labeling the full frame. 'sample' only reads one pixel per
+    block, which is much cheaper but can miss blobs smaller than a block.
+    """
+    height, width = pixels.shape[:2]
+    
+    if pool == 'sample':
+        offset = factor // 2
+        coarse = pixels[offset::factor, offset::factor]
+        # Blob edges can sit up to a block past the outermost sampled pixel
+        before, after = 2 * factor - offset, offset + 2 * factor + 1
+    else:
+        coarse = poolBlocks(pixels, factor)
+        before, after = 0, factor
+    
+    candidates = labelBlobs(toGrayscale(coarse) > threshold)
+    regions = [(max(0, int(top) * factor - before), min(height, int(bottom) * factor + after),
+                max(0, int(left) * factor - before), min(width, int(right) * factor + after))
+               for top, bottom, left, right in zip(candidates['top'], candidates['bottom'],
+                                                   candidates['left'], candidates['right'])]
+    regions = mergeRegions(regions)
+    
+    for _ in range(PYRAMID_MAX_PASSES):
+        blobs, cut = labelRegions(pixels, threshold, regions)
+        if not cut.any():
+            return blobs
+        
+        # A blob cut by a region edge continues outside it - grow and retry
+        regions = mergeRegions([
+            (max(0, y0 - factor), min(height, y1 + factor), max(0, x0 - factor), min(width, x1 + factor))
+            if region_cut else (y0, y1, x0, x1)
+            for (y0, y1, x0, x1), region_cut in zip(regions, cut)])
+    
+    # Regions kept growing - label the whole frame instead
+    return labelBlobs(toGrayscale(pixels) > threshold)
+
+# === BLOB TRACKING ===
+# Tracks live in storage['gameState']['tracks'] and are predicted with constant
+# velocity (input pixels per cook). Between full rescans only small windows
+# around the predicted positions are labeled.
+TRACK_WINDOW_SCALE = 2.0        # Search window half-size in blob radii
+TRACK_WINDOW_MARGIN = 8         # Extra input pixels around every search window
+TRACK_GATE_SCALE = 3.0          # Max match distance in blob radii
+TRACK_MIN_GATE = 20.0           # Max match distance floor in input pixels
+TRACK_MAX_MISSES = 5            # Cooks a track may coast before it is dropped
+TRACK_VELOCITY_SMOOTHING = 0.5
+
+def predictTrack(track):
+    """Constant velocity prediction of a track position"""
+    return track['x'] + track['vx'], track['y'] + track['vy']
+
+def searchTrackWindows(pixels, threshold, tracks):
+    """Label blobs only around predicted track positions - None if a blob spills out of its window"""
+    height, width = pixels.shape[:2]
+    
+    regions = []
+    for track in tracks:
+        px, py = predictTrack(track)
+        reach = (track['radius'] * TRACK_WINDOW_SCALE + TRACK_WINDOW_MARGIN +
+                 abs(track['vx']) + abs(track['vy']))
+        region = (max(0, int(py - reach)), min(height, int(py + reach) + 1),
+                  max(0, int(px - reach)), min(width, int(px + reach) + 1))
+        if region[0] < region[1] and region[2] < region[3]:
+            regions.append(region)
+    
+    blobs, cut = labelRegions(pixels, threshold, mergeRegions(regions))
+    if cut.any():
+        return None
+    return blobs
+
+def matchTracks(tracks, xs, ys):
+    """Greedy nearest-neighbour assignment of detections to tracks (-1 = no match)"""
+    assignment = np.full(len(tracks), -1)
+    if not tracks or not len(xs):
+        return assignment
+    
+    predicted = np.array([predictTrack(track) for track in tracks])
+    gate = np.array([max(TRACK_MIN_GATE, track['radius'] * TRACK_GATE_SCALE) for track in tracks])
+    dist = np.hypot(predicted[:, 0:1] - xs[None, :], predicted[:, 1:2] - ys[None, :])
+    
+    # Walk gated pairs from closest to farthest
+    candidates = np.flatnonzero(dist <= gate[:, None])
+    candidates = candidates[np.argsort(dist.ravel()[candidates], kind='stable')]
+    
+    detection_used = np.zeros(len(xs), dtype=bool)
+    for flat in candidates:
+        t, d = divmod(int(flat), len(xs))
+        if assignment[t] < 0 and not detection_used[d]:
+            assignment[t] = d
+            detection_used[d] = True
+    
+    return assignment
+
+def updateTracks(gameState, assignment, xs, ys, radii):
+    """Apply a track assignment and return the stable track id of every detection"""
+    tracks = gameState['tracks']
+    ids = np.zeros(len(xs), dtype=int)
+    
+    for track, d in zip(tracks, assignment):
+        if d < 0:
+            # Coast on the prediction until the track comes back or is dropped
+            track['x'], track['y'] = predictTrack(track)
+            track['misses'] += 1
+            continue
+        
+        smoothing = TRACK_VELOCITY_SMOOTHING
+        track['vx'] = smoothing * (xs[d] - track['x']) + (1 - smoothing) * track['vx']
+        track['vy'] = smoothing * (ys[d] - track['y']) + (1 - smoothing) * track['vy']
+        track['x'] = xs[d]
+        track['y'] = ys[d]
+        track['radius'] = radii[d]
+        track['misses'] = 0
+        ids[d] = track['id']
+    
+    gameState['tracks'] = [track for track in tracks if track['misses'] <= TRACK_MAX_MISSES]
+    
+    # Unmatched detections start new tracks
+    for d in np.flatnonzero(ids == 0):
+        track_id = gameState.get('nextTrackId', 1)
+        gameState['nextTrackId'] = track_id + 1
+        gameState['tracks'].append({
+            'id': track_id,
+            'x': xs[d],
+            'y': ys[d],
+            'vx': 0.0,
+            'vy': 0.0,
+            'radius': radii[d],
+            'misses': 0
+        })
+        ids[d] = track_id
+    
+    return ids
+
+def detectBlobs(pixels, threshold, pyramid_level, pyramid_pool):
+    """Full-frame blob detection, through the pyramid when enabled"""
+    if pyramid_level > 0:
+        return detectBlobsPyramid(pixels, threshold, 2 ** pyramid_level, pyramid_pool)
+    return labelBlobs(toGrayscale(pixels) > threshold)
+
+def detectMultipleCircles(scriptOp, tex_size, params, quality):
+    """Detect multiple white circles/players from input 0 with exact pixel mapping - NO SCIPY
+    
+    With Detectasync on, the frame is handed to the background worker and
+    the most recent finished result is returned instead; if the worker
+    fails, detection falls back to running here.
+    """
     input_top = scriptOp.inputs[0] if len(scriptOp.inputs) > 0 else None
     
     if not input_top:
         return []
     
-    try:
-        # Get detection parameters
-        detection_threshold = scriptOp.par.Detectionthreshold.eval()
-        min_blob_size = scriptOp.par.Minblobsize.eval()
-    except:
-        detection_threshold = 0.8
-        min_blob_size = 10
+    settings = (
+        params.detection_threshold,
+        params.min_blob_size,
+        min(params.pyramid_level + quality['pyramid_boost'], QUALITY_MAX_PYRAMID_LEVEL),
+        params.pyramid_pool,
+        params.tracking,
+        params.rescan_interval
+    )
     
     # Get input dimensions
     input_width = input_top.width
@@ -257,229 +1005,1578 @@ def detectMultipleCircles(scriptOp, tex_size):
     if pixels is None or len(pixels.shape) < 2:
         return []
     
-    # Convert to grayscale if needed
-    if len(pixels.shape) == 3:
-        gray = np.mean(pixels[:, :, :3], axis=2)
-    else:
-        gray = pixels
+    gameState = storage['gameState']
+    if params.detect_async and not storage.get('detectionWorkerFailed'):
+        return detectInBackground(pixels, tex_size, settings, gameState)
     
-    # Threshold to binary image
-    binary = (gray > detection_threshold).astype(np.uint8)
+    stopDetectionWorker()
+    gameState['detectionFrameTime'] = absTime.seconds
+    return detectCirclesInFrame(pixels, tex_size, settings, gameState)
+
+def detectCirclesInFrame(pixels, tex_size, settings, gameState):
+    """Circles in one input frame, mapped to output pixels - touches nothing but its arguments
+    
+    Safe to run off the main thread: tracking state lives in the gameState
+    dict passed in (the worker passes its own) and no TouchDesigner objects
+    are used.
+    """
+    detection_threshold, min_blob_size, pyramid_level, pyramid_pool, tracking, rescan_interval = settings
+    input_height, input_width = pixels.shape[:2]
+    tracks = gameState.setdefault('tracks', [])
+    
+    # Steady state: only look around where tracked blobs are expected
+    blobs = None
+    full_scan = True
+    if tracking and tracks and gameState.get('framesSinceRescan', 0) < rescan_interval:
+        blobs = searchTrackWindows(pixels, detection_threshold, tracks)
+        full_scan = blobs is None
+    
+    # Threshold to binary image and label every connected blob
+    if blobs is None:
+        blobs = detectBlobs(pixels, detection_threshold, pyramid_level, pyramid_pool)
+    
+    # Check blob size
+    keep = blobs['size'] >= min_blob_size
+    sizes = blobs['size'][keep]
+    xs = blobs['center_x'][keep]
+    ys = blobs['center_y'][keep]
+    
+    if tracking:
+        assignment = matchTracks(tracks, xs, ys)
+        
+        # A track that was live last cook went missing - rescan the whole frame
+        lost = any(d < 0 and track['misses'] == 0 for track, d in zip(tracks, assignment))
+        if lost and not full_scan:
+            blobs = detectBlobs(pixels, detection_threshold, pyramid_level, pyramid_pool)
+            keep = blobs['size'] >= min_blob_size
+            sizes = blobs['size'][keep]
+            xs = blobs['center_x'][keep]
+            ys = blobs['center_y'][keep]
+            assignment = matchTracks(tracks, xs, ys)
+            full_scan = True
+        
+        blob_ids = updateTracks(gameState, assignment, xs, ys, np.sqrt(sizes / np.pi))
+        gameState['framesSinceRescan'] = 0 if full_scan else gameState.get('framesSinceRescan', 0) + 1
+    else:
+        blob_ids = np.arange(1, len(sizes) + 1)
     
-    # Simple blob detection using flood fill approach
-    visited = np.zeros_like(binary, dtype=bool)
     circles = []
-    blob_id = 0
-    
-    # Scan for white pixels
-    for y in range(0, input_height, 5):  # Sample every 5 pixels for efficiency
-        for x in range(0, input_width, 5):
-            if binary[y, x] and not visited[y, x]:
-                # Found a new blob - collect all connected pixels
-                blob_pixels = []
-                stack = [(x, y)]
-                
-                while stack:
-                    cx, cy = stack.pop()
-                    if cx < 0 or cx >= input_width or cy < 0 or cy >= input_height:
-                        continue
-                    if visited[cy, cx] or not binary[cy, cx]:
-                        continue
-                    
-                    visited[cy, cx] = True
-                    blob_pixels.append((cx, cy))
-                    
-                    # Add neighbors (4-connectivity for speed)
-                    stack.extend([(cx+1, cy), (cx-1, cy), (cx, cy+1), (cx, cy-1)])
-                
-                # Check blob size
-                if len(blob_pixels) >= min_blob_size:
-                    blob_id += 1
-                    # Calculate blob center
-                    xs = [p[0] for p in blob_pixels]
-                    ys = [p[1] for p in blob_pixels]
-                    center_x = np.mean(xs)
-                    center_y = np.mean(ys)
-                    
-                    # Calculate approximate radius
-                    radius = np.sqrt(len(blob_pixels) / np.pi)
-                    
-                    # Map to output texture coordinates
-                    mapped_x = (center_x / input_width) * tex_size
-                    mapped_y = (center_y / input_height) * tex_size
-                    
-                    # Normalized position (0-1)
-                    norm_x = center_x / input_width
-                    norm_y = center_y / input_height
-                    
-                    circles.append({
-                        'id': blob_id,
-                        'pixel_x': int(mapped_x),
-                        'pixel_y': int(mapped_y),
-                        'norm_x': norm_x,
-                        'norm_y': norm_y,
-                        'radius': radius * (tex_size / input_width),
-                        'size': len(blob_pixels),
-                        'input_x': center_x,
-                        'input_y': center_y
-                    })
     
-    return circles
-
-def checkCircleCollisions(circles, lava_intensity, safe_zones, tex_size, threshold):
-    """Check collision for multiple circles with exact pixel mapping"""
-    collisions = {}
-    
-    for circle in circles:
-        px = circle['pixel_x']
-        py = circle['pixel_y']
-        radius = int(circle['radius'])
-        
-        # Ensure coordinates are within bounds
-        px = max(0, min(tex_size - 1, px))
-        py = max(0, min(tex_size - 1, py))
+    for blob_id, size, center_x, center_y in zip(blob_ids, sizes, xs, ys):
+        # Calculate approximate radius
+        radius = np.sqrt(size / np.pi)
         
-        is_colliding = False
-        in_safe_zone = False
+        # Map to output texture coordinates
+        mapped_x = (center_x / input_width) * tex_size
+        mapped_y = (center_y / input_height) * tex_size
         
-        # Check exact pixel at center
-        if 0 <= px < tex_size and 0 <= py < tex_size:
-            if lava_intensity[py, px] > threshold:
-                is_colliding = True
+        # Normalized position (0-1)
+        norm_x = center_x / input_width
+        norm_y = center_y / input_height
         
-        # Sample points around the circle perimeter
-        num_samples = max(8, int(radius * 2))
-        for i in range(num_samples):
-            angle = (2 * np.pi * i) / num_samples
-            check_x = int(px + radius * np.cos(angle))
-            check_y = int(py + radius * np.sin(angle))
-            
-            if 0 <= check_x < tex_size and 0 <= check_y < tex_size:
-                if lava_intensity[check_y, check_x] > threshold:
-                    is_colliding = True
-                    break
+        circles.append({
+            'id': int(blob_id),
+            'pixel_x': int(mapped_x),
+            'pixel_y': int(mapped_y),
+            'norm_x': norm_x,
+            'norm_y': norm_y,
+            'radius': radius * (tex_size / input_width),
+            'size': int(size),
+            'input_x': center_x,
+            'input_y': center_y
+        })
+    
+    return circles
+
+# === DETECTION WORKER ===
+# Optional background detection: onCook hands the newest input frame to one
+# persistent thread and renders with the most recent finished result, so on a
+# multi-core machine a cook costs max(render, detect) rather than the sum.
+# The hand-off is a single pending slot - a frame the worker has not started
+# on is replaced by the next one (latest frame wins). The worker tracks blobs
+# in its own copy of the tracking state and never touches gameState; each
+# result carries a snapshot that the cook copies into gameState under the
+# condition. Reset and switching Detectasync off stop and join the thread
+# first, so a detection in flight can never write back tracks from before.
+TRACKING_KEYS = ('tracks', 'nextTrackId', 'framesSinceRescan')
+DETECTION_JOIN_TIMEOUT = 1.0  # Seconds to wait for the worker to finish its frame when stopping it
+
+def trackingSnapshot(state):
+    """Copy of the blob tracking state in state - tracks are copied one by one"""
+    return {
+        'tracks': [dict(track) for track in state.get('tracks', [])],
+        'nextTrackId': state.get('nextTrackId', 1),
+        'framesSinceRescan': state.get('framesSinceRescan', 0)
+    }
+
+def getDetectionWorker():
+    """The running worker, starting one if needed"""
+    worker = storage.get('detectionWorker')
+    if worker is not None and worker['thread'].is_alive():
+        return worker
+    
+    worker = {
+        'condition': threading.Condition(),
+        'pending': None,  # (pixels, tex_size, settings, frame_time) waiting to be detected
+        'result': None,   # Latest finished {'circles', 'tracking', 'frameTime', 'latency'}
+        'tracking': trackingSnapshot(storage['gameState']),  # Worker-owned tracking state
+        'error': None,
+        'stop': False
+    }
+    worker['thread'] = threading.Thread(target=runDetectionWorker, args=(worker,),
+                                        name='circle-detection', daemon=True)
+    worker['thread'].start()
+    storage['detectionWorker'] = worker
+    return worker
+
+def runDetectionWorker(worker):
+    """Worker loop - detect whatever frame is pending until asked to stop"""
+    condition = worker['condition']
+    while True:
+        with condition:
+            while worker['pending'] is None and not worker['stop']:
+                condition.wait()
+            if worker['stop']:
+                return
+            job = worker['pending']
+            worker['pending'] = None
         
-        # Check if in safe zone with exact boundaries
-        for zone in safe_zones:
-            x_start, x_end, y_start, y_end = zone
-            # Check if circle center is in safe zone
-            if x_start <= px <= x_end and y_start <= py <= y_end:
-                in_safe_zone = True
-                break
+        pixels, tex_size, settings, frame_time = job
+        started = perf_counter_ns()
+        try:
+            circles = detectCirclesInFrame(pixels, tex_size, settings, worker['tracking'])
+        except Exception as error:
+            worker['error'] = error
+            return
         
-        collisions[circle['id']] = {
-            'colliding': is_colliding,
-            'in_safe_zone': in_safe_zone,
-            'position': (px, py)
+        result = {
+            'circles': circles,
+            'tracking': trackingSnapshot(worker['tracking']),
+            'frameTime': frame_time,
+            'latency': (perf_counter_ns() - started) / 1e6
         }
+        with condition:
+            worker['result'] = result
+
+def detectInBackground(pixels, tex_size, settings, gameState):
+    """Queue this frame and return the newest finished detection ([] until the first one lands)"""
+    worker = getDetectionWorker()
+    if worker['error'] is not None:
+        print(f"⚠️ Background detection failed ({worker['error']}), detecting synchronously")
+        storage['detectionWorkerFailed'] = True
+        stopDetectionWorker()
+        return []
     
-    return collisions
+    with worker['condition']:
+        worker['pending'] = (pixels, tex_size, settings, absTime.seconds)
+        worker['condition'].notify()
+        result = worker['result']
+        if result is not None:
+            gameState.update(result['tracking'])
+    
+    if result is None:
+        return []
+    gameState['detectionFrameTime'] = result['frameTime']
+    return result['circles']
+
+def stopDetectionWorker():
+    """Stop the worker and wait for it to finish its current frame"""
+    worker = storage.pop('detectionWorker', None)
+    if worker is None:
+        return
+    with worker['condition']:
+        worker['stop'] = True
+        worker['condition'].notify()
+    worker['thread'].join(DETECTION_JOIN_TIMEOUT)
+
+# === DANGER FIELD ===
+# Circles are tested against an exact Euclidean distance transform of the lava
+# above Collisionthreshold instead of sampled perimeter points, so no beam can
+# slip between samples. The transform is separable: the vertical pass - every
+# pixel's distance to the nearest hot pixel in its column - is built for the
+# whole frame once per cook from a running max / min of hot row indices. The
+# horizontal pass, min over x' of g(y, x')^2 + (x - x')^2, is only evaluated at
+# the points queried, as one row lookup each.
+DANGER_NONE = 1 << 14  # Column distance where a column holds no lava at all - fits int16 up to 2048 rows
+DANGER_STRIPS = 32  # Row strips scanned side by side by scanColumns
+
+def scanColumns(array, ufunc):
+    """Running ufunc (np.maximum = running max) down the columns of array, in place
+    
+    Rows are cut into DANGER_STRIPS strips scanned side by side, so the Python
+    loop is one strip long rather than one frame - ufunc.accumulate along
+    axis 0 is slower still. Each strip then takes in the running value from
+    the last row of the strip above it.
+    """
+    height = array.shape[0]
+    length = max(1, height // DANGER_STRIPS)
+    num_strips = height // length
+    strips = array[:num_strips * length].reshape(num_strips, length, -1)
+    for y in range(1, length):
+        ufunc(strips[:, y - 1], strips[:, y], out=strips[:, y])
+    for s in range(1, num_strips):
+        ufunc(strips[s], strips[s - 1, -1], out=strips[s])
+    for y in range(num_strips * length, height):
+        ufunc(array[y - 1], array[y], out=array[y])
+
+def buildDangerField(lava_intensity, threshold, buffers):
+    """Vertical pass of the danger EDT - distance to the nearest hot pixel in the same column"""
+    height, width = lava_intensity.shape
+    pool = buffers.get('danger')
+    if pool is None or pool['field'].shape != lava_intensity.shape:
+        pool = {
+            'field': np.empty((height, width), dtype=np.int16),
+            'below': np.empty((height, width), dtype=np.int16),
+            'hot': np.empty((height, width), dtype=bool),
+            'rows': np.arange(height, dtype=np.int16)[:, None],
+        }
+        buffers['danger'] = pool
+    field, below, hot, rows = pool['field'], pool['below'], pool['hot'], pool['rows']
+    
+    kernel = KERNELS.get('dangerColumns')
+    if kernel is not None:
+        # float32 threshold, as np.greater compares it against the float32 lava
+        return kernel(lava_intensity, np.float32(threshold), field)
+    
+    np.greater(lava_intensity, threshold, out=hot)
+    
+    # Nearest hot row at or above, then at or below - DANGER_NONE away when there is none
+    above = field
+    above.fill(-DANGER_NONE)
+    np.copyto(above, rows, where=hot)
+    scanColumns(above, np.maximum)
+    np.subtract(rows, above, out=above)
+    
+    below.fill(height + DANGER_NONE)
+    np.copyto(below, rows, where=hot)
+    scanColumns(below[::-1], np.minimum)
+    np.subtract(below, rows, out=below)
+    
+    np.minimum(above, below, out=field)
+    return field
+
+def dangerDistance(field, xs, ys):
+    """Exact distance from each integer (x, y) to the nearest hot pixel - inf where there is none"""
+    columns = np.arange(field.shape[1])
+    vertical = field[ys].astype(np.int64)
+    squared = (vertical * vertical + (columns[None, :] - xs[:, None]) ** 2).min(axis=1)
+    return np.where(squared >= DANGER_NONE * DANGER_NONE, np.inf, np.sqrt(squared))
+
+def queryCircleCollisions(centers, radii, field, safe_zones):
+    """Batched lava/safe-zone test for N circles at once
+    
+    centers is (N, 2) integer x, y inside the texture, radii is (N,) integer
+    and safe_zones is (M, 4) of x_start, x_end, y_start, y_end. A circle
+    collides when any hot pixel lies within its radius, and containment in
+    any safe zone is one broadcasted comparison. Returns (colliding,
+    in_safe_zone, distance) with distance from each centre to the nearest lava.
+    """
+    distance = dangerDistance(field, centers[:, 0], centers[:, 1])
+    colliding = distance <= radii
+    
+    # Centre inside any rectangle, edges included
+    zones = np.asarray(safe_zones, dtype=np.intp).reshape(-1, 4)
+    points = centers[:, None, :]
+    in_safe_zone = ((points >= zones[None, :, 0::2]) & (points <= zones[None, :, 1::2])).all(axis=2).any(axis=1)
+    
+    return colliding, in_safe_zone, distance
+
+def checkCircleCollisions(circles, lava_intensity, safe_zones, tex_size, threshold, buffers, lava_args=None):
+    """Check collision for multiple circles with exact pixel mapping
+    
+    lava_args, given when lava_intensity was upsampled from a reduced field,
+    are the full-resolution effect arguments to probe the lava exactly.
+    """
+    if not circles:
+        return {}
+    
+    # Ensure coordinates are within bounds
+    centers = np.array([(c['pixel_x'], c['pixel_y']) for c in circles], dtype=np.intp).reshape(-1, 2)
+    np.clip(centers, 0, tex_size - 1, out=centers)
+    radii = np.array([int(c['radius']) for c in circles], dtype=np.intp)
+    
+    field = buildDangerField(lava_intensity, threshold, buffers)
+    colliding, in_safe_zone, distance = queryCircleCollisions(centers, radii, field, safe_zones)
+    if lava_args is not None:
+        colliding = probeLava(centers, radii, tex_size, threshold, lava_args, buffers)
+    
+    return {
+        circle['id']: {
+            'colliding': bool(colliding[i]),
+            'in_safe_zone': bool(in_safe_zone[i]),
+            'position': (int(centers[i, 0]), int(centers[i, 1])),
+            'danger_distance': float(distance[i])
+        }
+        for i, circle in enumerate(circles)
+    }
+
+def createPlayers(numPlayers, numColors):
+    """Simulated players as parallel arrays, one row per player"""
+    # Per player: x, y, then velocity x, y - same draw order as one player at a time
+    draws = np.random.random((numPlayers, 4))
+    return {
+        'position': draws[:, 0:2].copy(),
+        'velocity': draws[:, 2:4] * 0.02 - 0.01,
+        'color': np.arange(numPlayers) % numColors,
+        'score': np.zeros(numPlayers, dtype=int),
+        'isAlive': np.ones(numPlayers, dtype=bool)
+    }
 
 def updatePlayers(deltaTime):
     """Update player positions in real-time"""
-    if 'players' not in storage['gameState']:
+    players = storage['gameState'].get('players')
+    if not players:
         return
     
-    for pid, player in storage['gameState']['players'].items():
-        if not player['isAlive']:
+    alive = players['isAlive']
+    position = players['position']
+    velocity = players['velocity']
+    
+    # Update position with velocity
+    position[alive] += velocity[alive] * deltaTime
+    
+    # Bounce off edges
+    bounced = alive[:, None] & ((position <= 0) | (position >= 1))
+    velocity[bounced] *= -1
+    np.clip(position, 0, 1, out=position)
+    
+    # Random movement changes - 2% chance to change direction
+    turning = alive & (np.random.random(len(alive)) < 0.02)
+    if turning.any():
+        nudged = velocity[turning] + (np.random.random((int(turning.sum()), 2)) - 0.5) * 0.01
+        
+        # Limit max velocity
+        max_vel = 0.03
+        velocity[turning] = np.clip(nudged, -max_vel, max_vel)
+
+# === SCAN HIT INDEX ===
+# Alive players sorted along each scanner's axis, so every scan becomes two
+# binary searches instead of a pass over all players: O((P + S) log P).
+# A player is hit when its axis key is strictly within the scan's hit width.
+SCAN_WIDTH_SCALE = {'horizontal': 1, 'vertical': 1, 'diagonal': 2, 'ring': 1}
+
+def scanAxisKeys(position, scan_type, tex_size):
+    """Player coordinate along a scanner's axis, in pixels"""
+    x = position[:, 0] * tex_size
+    y = position[:, 1] * tex_size
+    if scan_type == 'horizontal':
+        return y
+    if scan_type == 'vertical':
+        return x
+    if scan_type == 'diagonal':
+        return x + y
+    center = tex_size // 2
+    return np.hypot(x - center, y - center)
+
+def buildHitIndex(players, scan_types, tex_size):
+    """Sorted axis keys and matching player ids for each scan type in use"""
+    alive_ids = np.flatnonzero(players['isAlive'])
+    position = players['position'][alive_ids]
+    index = {}
+    for scan_type in scan_types:
+        keys = scanAxisKeys(position, scan_type, tex_size)
+        order = np.argsort(keys, kind='stable')
+        index[scan_type] = (keys[order], alive_ids[order])
+    return index
+
+def queryHitIndex(index, scan_type, scan_pos, width):
+    """Player ids within width of each scan position - one entry per (scan, player) hit"""
+    keys, ids = index[scan_type]
+    scan_pos = np.asarray(scan_pos, dtype=float)
+    lo = np.searchsorted(keys, scan_pos - width, side='right')
+    hi = np.searchsorted(keys, scan_pos + width, side='left')
+    counts = np.maximum(hi - lo, 0)
+    if not counts.any():
+        return ids[:0]
+    # Concatenated ranges ids[lo:hi] without a Python loop over scans
+    starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+    return ids[starts + np.arange(counts.sum())]
+
+def checkPlayerScanCollisions(scanPositions, tex_size, scanner_width):
+    """Check if players are hit by scans"""
+    players = storage['gameState'].get('players')
+    if not players or not scanPositions:
+        return
+    
+    by_type = {}
+    for scan_pos, scan_type in scanPositions:
+        by_type.setdefault(scan_type, []).append(scan_pos)
+    
+    index = buildHitIndex(players, by_type, tex_size)
+    hits = [queryHitIndex(index, scan_type, positions, scanner_width * SCAN_WIDTH_SCALE[scan_type])
+            for scan_type, positions in by_type.items()]
+    hit_counts = np.bincount(np.concatenate(hits), minlength=len(players['isAlive']))
+    
+    # Danger-coloured players go down on their first hit; everyone else scores per scan
+    danger = players['color'] == storage['gameState']['currentDangerColor']
+    eliminated = np.flatnonzero((hit_counts > 0) & danger)
+    players['isAlive'][eliminated] = False
+    players['score'] += np.where(danger, 0, hit_counts)
+    reportEliminations(players, eliminated)
+
+def reportEliminations(players, eliminated):
+    """Print eliminated players, summarised once a crowd goes down at the same time"""
+    if len(eliminated) > 5:
+        print(f"💀 {len(eliminated)} players were eliminated!")
+        return
+    for pid in eliminated:
+        print(f"💀 Player {pid} (color {players['color'][pid]}) was eliminated!")
+
+# === OUTPUT FORMAT ===
+# The output and the cached base layer are stored in the Outputformat pixel
+# type, so the passes that write them (composeBase, the stamps, the blit)
+# quantize as they go instead of converting a float32 frame afterwards. The
+# lava field itself stays float32 for collisions. Writers look the scale up
+# from the array's dtype: value * scale + bias, cast, gives round-to-nearest
+# for uint8 and exact values for the float formats.
+OUTPUT_FORMATS = {'float32': np.float32, 'float16': np.float16, 'uint8': np.uint8}
+PIXEL_SCALES = {
+    np.dtype(np.float32): (1.0, 0.0),
+    np.dtype(np.float16): (1.0, 0.0),
+    np.dtype(np.uint8): (255.0, 0.5),
+}
+
+def pixelColor(color, dtype):
+    """A 0-1 colour (or single value) as pixel values of dtype"""
+    scale, bias = PIXEL_SCALES[np.dtype(dtype)]
+    return (np.clip(np.asarray(color, dtype=np.float64), 0.0, 1.0) * scale + bias).astype(dtype)
+
+# === SPRITE STAMPS ===
+# Disc sprites are drawn from precomputed intensity masks instead of per-pixel
+# loops. Masks are keyed by (radius, falloff) and kept in an LRU cache.
+STAMP_CACHE_SIZE = 64
+
+CIRCLE_FALLOFF = 0.3
+CIRCLE_COLLIDING_COLOR = (1.0, 0.2, 0.2)
+CIRCLE_SAFE_COLOR = (0.2, 1.0, 0.2)
+CIRCLE_CLEAR_COLOR = (1.0, 1.0, 1.0)
+CROSSHAIR_COLOR = (1.0, 0.0, 1.0)
+
+PLAYER_SIZE = 8
+PLAYER_FALLOFF = 0.5
+
+STAMP_BATCH_MIN = 64  # Stamp counts from here on are drawn through one z-buffered scatter
+
+def getStamp(radius, falloff):
+    """Disc intensity mask for (radius, falloff) - 1 at the centre fading by falloff at the rim"""
+    cache = storage.setdefault('stampCache', OrderedDict())
+    key = (radius, falloff)
+    
+    stamp = cache.get(key)
+    if stamp is not None:
+        cache.move_to_end(key)
+        return stamp
+    
+    dy, dx = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    dist = np.sqrt(dx * dx + dy * dy)
+    inside = dist <= radius
+    intensity = np.where(inside, 1.0 - (dist / radius) * falloff, 0.0)
+    
+    stamp = (intensity[:, :, None], inside[:, :, None])
+    cache[key] = stamp
+    if len(cache) > STAMP_CACHE_SIZE:
+        cache.popitem(last=False)
+    return stamp
+
+def drawStamp(output, px, py, radius, falloff, color):
+    """Write a coloured disc stamp centred on (px, py) with one clipped slice write"""
+    height, width = output.shape[:2]
+    y0 = max(0, py - radius)
+    y1 = min(height, py + radius + 1)
+    x0 = max(0, px - radius)
+    x1 = min(width, px + radius + 1)
+    if y0 >= y1 or x0 >= x1:
+        return
+    
+    intensity, inside = getStamp(radius, falloff)
+    sy = y0 - (py - radius)
+    sx = x0 - (px - radius)
+    window = (slice(sy, sy + y1 - y0), slice(sx, sx + x1 - x0))
+    
+    scale, bias = PIXEL_SCALES[output.dtype]
+    values = intensity[window] * (np.asarray(color) * scale)
+    if bias:
+        values += bias
+    np.copyto(output[y0:y1, x0:x1, :3], values, where=inside[window], casting='unsafe')
+
+# === GAUSSIAN FALLOFF ===
+# Every lava effect fades with the distance d from its centre line as
+# exp(-(d / width)^2). The curve is tabulated once per width and read back by
+# linear interpolation, and effects build their 2D fields from these 1D
+# profiles, so no exp runs per pixel. Beyond FALLOFF_CUTOFF widths the falloff
+# is 0 and effects skip those pixels entirely.
+FALLOFF_CUTOFF = 3.0
+FALLOFF_SAMPLES_PER_PIXEL = 4
+
+def falloffShape(t):
+    """Falloff at t widths from the centre line - the one place to change the shape of every effect"""
+    return np.exp(-(t * t))
+
+def falloffReach(width):
+    """Distance in pixels beyond which an effect of this width contributes nothing"""
+    return FALLOFF_CUTOFF * width
+
+def getFalloffTables(width):
+    """Falloff lookup tables for one width, keyed by Scannerwidth in storage
+    
+    'distances'/'values' sample the curve FALLOFF_SAMPLES_PER_PIXEL times per
+    pixel for interpolation. 'squared' holds the falloff at every integer
+    squared distance, with a trailing 0 for anything past the cutoff.
+    """
+    tables = storage.setdefault('falloffTables', {})
+    table = tables.get(width)
+    if table is not None:
+        return table
+    
+    reach = falloffReach(width)
+    distances = np.arange(int(np.ceil(reach * FALLOFF_SAMPLES_PER_PIXEL)) + 1) / FALLOFF_SAMPLES_PER_PIXEL
+    squared = falloffShape(np.sqrt(np.arange(int(reach * reach) + 1)) / width).astype(np.float32)
+    
+    table = {
+        'distances': distances,
+        'values': falloffShape(distances / width),
+        'squared': np.append(squared, np.float32(0.0))
+    }
+    tables[width] = table
+    return table
+
+def gaussianFalloff(distance, width):
+    """Falloff of a 1D array of signed distances through the interpolated table (0 past the cutoff)"""
+    table = getFalloffTables(width)
+    return np.interp(np.abs(distance), table['distances'], table['values'], right=0.0).astype(np.float32)
+
+def clipSpan(lo, hi, size):
+    """Integer index range covering [lo, hi] clipped to [0, size)"""
+    return max(0, int(np.floor(lo))), min(size, int(np.ceil(hi)) + 1)
+
+def renderDiagonalScan(lava_intensity, geometry, diag_pos, width, profile, row0=0):
+    """Max a diagonal (x + y) beam into lava_intensity, only over rows/columns the beam reaches
+    
+    The beam only depends on x + y, so it is one 1D profile read through a
+    strided view where view[y, x] == profile[x + y] - no per-pixel work
+    beyond the max itself. lava_intensity may be a band of rows starting at
+    row0 of the full frame.
+    """
+    tex_size = geometry['size']
+    reach = falloffReach(width)
+    y0, y1 = clipSpan(diag_pos - reach - (tex_size - 1), diag_pos + reach, tex_size)
+    x0, x1 = clipSpan(diag_pos - reach - (tex_size - 1), diag_pos + reach, tex_size)
+    y0, y1 = max(y0, row0), min(y1, row0 + lava_intensity.shape[0])
+    if y0 >= y1 or x0 >= x1:
+        return
+    
+    band = np.lib.stride_tricks.as_strided(
+        profile, shape=(tex_size, tex_size), strides=(profile.strides[0], profile.strides[0]), writeable=False
+    )
+    region = lava_intensity[y0 - row0:y1 - row0, x0:x1]
+    np.maximum(region, band[y0:y1, x0:x1], out=region)
+
+def renderCircularWave(lava_intensity, geometry, wave_pos, width, profile, scratch, row0=0):
+    """Max an expanding ring into lava_intensity, only inside the box around its outer edge
+    
+    lava_intensity may be a band of rows starting at row0 of the full frame.
+    """
+    tex_size = geometry['size']
+    center = tex_size // 2
+    outer = wave_pos + falloffReach(width)
+    x0, x1 = clipSpan(center - outer, center + outer, tex_size)
+    y0, y1 = max(x0, row0), min(x1, row0 + lava_intensity.shape[0])
+    if y0 >= y1:
+        return
+    
+    # Ring profile over radial samples, gathered through the cached radius index.
+    # Gather whole rows so the index block stays contiguous (no index copy)
+    ring = scratchView(scratch, (y1 - y0, tex_size))
+    np.take(profile, geometry['radial_index'][y0:y1], mode='clip', out=ring)
+    
+    region = lava_intensity[y0 - row0:y1 - row0, x0:x1]
+    np.maximum(region, ring[:, x0:x1], out=region)
+
+def getBurstStamp(width, strength):
+    """One burst over its whole reach, (2R + 1) square around the centre - cached with the falloff tables"""
+    table = getFalloffTables(width)
+    stamps = table.setdefault('bursts', {})
+    stamp = stamps.get(strength)
+    if stamp is None:
+        reach = int(np.ceil(falloffReach(width)))
+        offsets = np.arange(-reach, reach + 1)
+        squared = (offsets * offsets)[:, None] + (offsets * offsets)[None, :]
+        stamp = np.take(table['squared'] * np.float32(strength), squared, mode='clip')
+        stamp.setflags(write=False)
+        stamps[strength] = stamp
+    return stamp
+
+def renderBursts(lava_intensity, centers, width, strength):
+    """Max round bursts at integer (x, y) centres into lava_intensity
+    
+    Every burst is the same stamp, so each one is a single clipped max of the
+    cached stamp into the region it reaches.
+    """
+    height, width_px = lava_intensity.shape
+    stamp = getBurstStamp(width, strength)
+    reach = stamp.shape[0] // 2
+    
+    for cx, cy in centers:
+        y0, y1 = max(0, cy - reach), min(height, cy + reach + 1)
+        x0, x1 = max(0, cx - reach), min(width_px, cx + reach + 1)
+        if y0 >= y1 or x0 >= x1:
             continue
         
-        # Update position with velocity
-        player['position'][0] += player['velocity'][0] * deltaTime
-        player['position'][1] += player['velocity'][1] * deltaTime
+        region = lava_intensity[y0:y1, x0:x1]
+        np.maximum(region, stamp[y0 - cy + reach:y1 - cy + reach, x0 - cx + reach:x1 - cx + reach], out=region)
+
+# === BURST SCHEDULE ===
+# Burst positions come from a private generator, not the global NumPy RNG, so
+# they never disturb the players' randomness. Time is cut into slots of
+# BURST_SLOT_SECONDS; a slot's positions are drawn once from a generator
+# seeded by (BURST_SEED, slot), so they are the same whenever that slot is
+# visited again and cost nothing for the rest of the slot.
+BURST_SLOT_SECONDS = 0.5
+BURST_SEED = 0x1A7A
+
+def burstCenters(time, burst_count, tex_size, scanner_width):
+    """(column, row) burst centres for the time slot time falls in"""
+    slot = int(time / BURST_SLOT_SECONDS)
+    key = (slot, burst_count, tex_size, scanner_width)
+    schedule = storage.get('burstSchedule')
+    if schedule is not None and schedule['key'] == key:
+        return schedule['centers']
+    
+    # Keep bursts a scanner width from the edges when the frame is big enough
+    low = min(scanner_width, tex_size // 2)
+    high = max(low + 1, tex_size - scanner_width)
+    rng = np.random.default_rng((BURST_SEED, slot))
+    rows, columns = rng.integers(low, high, (2, burst_count))
+    centers = list(zip(columns.tolist(), rows.tolist()))
+    
+    storage['burstSchedule'] = {'key': key, 'centers': centers}
+    return centers
+
+# === SCANNER PROFILES ===
+def scannerBeams(time, tex_size, num_h_scanners, num_v_scanners, scan_speed, scan_pulse):
+    """Position, orientation and pulse strength of every horizontal and vertical beam this cook"""
+    beams = []
+    
+    # HORIZONTAL SCANNERS
+    for i in range(num_h_scanners):
+        phase = (i / max(num_h_scanners, 1)) * np.pi * 2
+        scan_pos = (np.sin(time * scan_speed + phase) * 0.4 + 0.5) * tex_size
         
-        # Bounce off edges
-        if player['position'][0] <= 0 or player['position'][0] >= 1:
-            player['velocity'][0] *= -1
-            player['position'][0] = max(0, min(1, player['position'][0]))
+        pulse = 1.0
+        if scan_pulse:
+            pulse = np.sin(time * 5 + i) * 0.2 + 0.8
+        beams.append((scan_pos, 'horizontal', pulse))
+    
+    # VERTICAL SCANNERS
+    for i in range(num_v_scanners):
+        phase = (i / max(num_v_scanners, 1)) * np.pi * 2
+        scan_pos = (np.cos(time * scan_speed * 0.8 + phase) * 0.4 + 0.5) * tex_size
         
-        if player['position'][1] <= 0 or player['position'][1] >= 1:
-            player['velocity'][1] *= -1
-            player['position'][1] = max(0, min(1, player['position'][1]))
+        pulse = 1.0
+        if scan_pulse:
+            pulse = np.sin(time * 4.5 + i * 2) * 0.2 + 0.8
+        beams.append((scan_pos, 'vertical', pulse))
+    
+    return beams
+
+def renderScannerProfiles(axis, beams, scanner_width):
+    """Max of all scanner beams as 1D profiles along y (horizontal beams) and x (vertical beams)
+    
+    A horizontal beam only varies with y and a vertical beam only with x, so
+    each beam costs O(N) and the frame is built by one broadcasted max of the
+    two profiles.
+    """
+    row_profile = np.zeros(len(axis), dtype='float32')
+    column_profile = np.zeros(len(axis), dtype='float32')
+    
+    for scan_pos, scan_type, pulse in beams:
+        beam = gaussianFalloff(axis - scan_pos, scanner_width) * pulse
+        # Vertical beams vary along x, so their profile is the column profile
+        profile = row_profile if scan_type == 'horizontal' else column_profile
+        np.maximum(profile, beam, out=profile)
+    
+    return row_profile, column_profile
+
+def lavaProfiles(geometry, beams, scanner_width, diag_pos, wave_pos):
+    """The 1D profiles every lava effect is read from - built once per cook and shared by every band
+    
+    diag_pos / wave_pos are None when those effects are off.
+    """
+    row_profile, column_profile = renderScannerProfiles(geometry['x_axis'][0], beams, scanner_width)
+    profiles = {'rows': row_profile, 'columns': column_profile, 'diagonal': None, 'ring': None}
+    if diag_pos is not None:
+        width = scanner_width * SCAN_WIDTH_SCALE['diagonal']
+        profiles['diagonal'] = gaussianFalloff(geometry['diagonal_axis'] - diag_pos, width) * np.float32(0.7)
+    if wave_pos is not None:
+        width = scanner_width * SCAN_WIDTH_SCALE['ring']
+        profiles['ring'] = gaussianFalloff(geometry['radial_samples'] - wave_pos, width) * np.float32(0.6)
+    return profiles
+
+def renderLavaRows(lava_rows, row0, geometry, profiles, scanner_width, diag_pos, wave_pos, burst_centers, scratch):
+    """Render every lava effect into rows row0.. of a geometry['size'] square frame
+    
+    Any band of rows renders through the same code with the same profiles,
+    so the whole frame, fused bands and tile worker bands all produce
+    identical pixels.
+    """
+    num_rows = lava_rows.shape[0]
+    
+    # HORIZONTAL + VERTICAL SCANNERS - one 1D profile per axis
+    np.maximum(profiles['rows'][row0:row0 + num_rows, None], profiles['columns'][None, :], out=lava_rows)
+    
+    # DIAGONAL SCANNER
+    if diag_pos is not None:
+        renderDiagonalScan(lava_rows, geometry, diag_pos, scanner_width * SCAN_WIDTH_SCALE['diagonal'],
+                           profiles['diagonal'], row0)
+    
+    # CIRCULAR WAVE
+    if wave_pos is not None:
+        renderCircularWave(lava_rows, geometry, wave_pos, scanner_width * SCAN_WIDTH_SCALE['ring'],
+                           profiles['ring'], scratch, row0)
+    
+    # RANDOM BURSTS - centres are (column, row), so only the row moves into the band
+    if burst_centers:
+        renderBursts(lava_rows, [(cx, cy - row0) for cx, cy in burst_centers], scanner_width, 0.8)
+
+def renderLava(lava_intensity, buffers, scale, beams, scanner_width, diag_pos, wave_pos, burst_centers):
+    """Render every lava effect into lava_intensity, at 1/scale resolution when scale > 1
+    
+    Positions and widths come in output pixels. A reduced field is rendered
+    into its own pooled buffer and upsampled to full size, so colouring and
+    the danger field still see a full-resolution field.
+    """
+    tex_size = lava_intensity.shape[0]
+    
+    target = lava_intensity
+    if scale > 1:
+        reduced_size = -(-tex_size // scale)
+        target = buffers.setdefault('reducedLava', {}).get(reduced_size)
+        if target is None:
+            target = np.empty((reduced_size, reduced_size), dtype='float32')
+            buffers['reducedLava'][reduced_size] = target
+        beams = [(scan_pos / scale, scan_type, pulse) for scan_pos, scan_type, pulse in beams]
+        scanner_width = scanner_width / scale
+        diag_pos = None if diag_pos is None else diag_pos / scale
+        wave_pos = None if wave_pos is None else wave_pos / scale
+        burst_centers = [((cx + scale // 2) // scale, (cy + scale // 2) // scale) for cx, cy in burst_centers]
+    
+    # Coordinate grids and distance fields only change with the rendered size
+    geometry = getGeometry(target.shape[0])
+    profiles = lavaProfiles(geometry, beams, scanner_width, diag_pos, wave_pos)
+    renderLavaRows(target, 0, geometry, profiles, scanner_width, diag_pos, wave_pos, burst_centers,
+                   buffers['scratch'])
+    
+    if scale > 1:
+        upsampleLava(target, lava_intensity, scale, buffers)
+
+# === REDUCED LAVA ===
+# Every lava effect is a Gaussian falloff about Scannerwidth wide, so the field
+# can be rendered on a grid of step s and brought back with a separable
+# bilinear pass. On a single beam the error is at most s^2 / (4 w^2); where
+# beams cross, the max() between them puts a crease in the field that bilinear
+# rounds off, and burst centres snap to the coarse grid, so expect a few 8-bit
+# levels at s = Scannerwidth / LAVA_WIDTH_PER_STEP - what 'auto' picks.
+# Upsampling costs two full-frame passes, so 'auto' stays at full resolution
+# below LAVA_AUTO_MIN_STEP, where rendering the effects directly is cheaper.
+# The quality governor may go coarser still. Collisions are not left to the
+# upsampled field: probeLava renders the rows under each circle exactly.
+LAVA_WIDTH_PER_STEP = 16
+LAVA_AUTO_MIN_STEP = 4
+LAVA_MAX_STEP = 8
+LAVA_MIN_SIZE = 32  # Never render a reduced field smaller than this
+
+def lavaScale(setting, scanner_width, tex_size, quality_scale):
+    """Lava render step for this cook - a power of two, 1 for full resolution"""
+    if setting == 'auto':
+        scale = 1
+        while scale * 2 <= min(LAVA_MAX_STEP, scanner_width / LAVA_WIDTH_PER_STEP):
+            scale *= 2
+        if scale < LAVA_AUTO_MIN_STEP:
+            scale = 1
+    else:
+        try:
+            scale = int(setting)
+        except ValueError:
+            scale = 1
+    
+    scale = max(scale, quality_scale)
+    while scale > 1 and tex_size // scale < LAVA_MIN_SIZE:
+        scale //= 2
+    return scale
+
+def upsampleLava(reduced, lava_intensity, scale, buffers):
+    """Separable bilinear upsampling of a reduced lava field into lava_intensity
+    
+    Reduced sample j sits on output pixel j * scale, so the two fields agree
+    exactly there. Scale is an integer, so output pixels with the same phase
+    (index % scale) share one interpolation weight: each phase is a strided
+    multiply-add of the samples and their steps to the next sample - no
+    gathers, which are several times slower than the arithmetic here.
+    """
+    tex_size = lava_intensity.shape[0]
+    reduced_size = reduced.shape[0]
+    pool = buffers.get('upsample')
+    if pool is None or pool['rows'].shape != (reduced_size, tex_size):
+        pool = {
+            'rows': np.empty((reduced_size, tex_size), dtype=np.float32),
+            'steps': np.empty((reduced_size, tex_size), dtype=np.float32),
+        }
+        buffers['upsample'] = pool
+    rows, steps = pool['rows'], pool['steps']
+    
+    # Columns first, on the small field
+    column_steps = scratchView(buffers['scratch'], reduced.shape)
+    np.subtract(reduced[:, 1:], reduced[:, :-1], out=column_steps[:, :-1])
+    column_steps[:, -1] = 0.0
+    upsamplePhases(reduced, column_steps, rows, scale, axis=1)
+    
+    # Then rows at full size
+    np.subtract(rows[1:], rows[:-1], out=steps[:-1])
+    steps[-1] = 0.0
+    upsamplePhases(rows, steps, lava_intensity, scale, axis=0)
+
+def upsamplePhases(samples, sample_steps, out, scale, axis):
+    """out[phase::scale] = samples + sample_steps * phase / scale along axis, for every phase"""
+    for phase in range(scale):
+        target = out[phase::scale] if axis == 0 else out[:, phase::scale]
+        count = target.shape[axis]
+        source = samples[:count] if axis == 0 else samples[:, :count]
+        if phase == 0:
+            np.copyto(target, source)
+            continue
+        source_steps = sample_steps[:count] if axis == 0 else sample_steps[:, :count]
+        np.multiply(source_steps, np.float32(phase / scale), out=target)
+        np.add(target, source, out=target)
+
+def probeLava(centers, radii, tex_size, threshold, lava_args, buffers):
+    """Exact circle/lava hits when the lava field was upsampled
+    
+    The rows each circle covers are rendered at full resolution through
+    renderLavaRows (lava_args are its full-resolution effect arguments) and
+    tested over the disc.
+    """
+    beams, scanner_width, diag_pos, wave_pos, burst_centers = lava_args
+    geometry = getGeometry(tex_size)
+    profiles = lavaProfiles(geometry, beams, scanner_width, diag_pos, wave_pos)
+    hits = np.zeros(len(centers), dtype=bool)
+    
+    for i, ((px, py), radius) in enumerate(zip(centers.tolist(), radii.tolist())):
+        y0, y1 = max(0, py - radius), min(tex_size, py + radius + 1)
+        x0, x1 = max(0, px - radius), min(tex_size, px + radius + 1)
+        
+        band = buffers.get('probe')
+        if band is None or band.shape[0] < y1 - y0:
+            band = np.empty((2 * radius + 1, tex_size), dtype=np.float32)
+            buffers['probe'] = band
+        rows = band[:y1 - y0]
+        renderLavaRows(rows, y0, geometry, profiles, scanner_width, diag_pos, wave_pos, burst_centers,
+                       buffers['scratch'])
         
-        # Random movement changes
-        if np.random.random() < 0.02:  # 2% chance to change direction
-            player['velocity'][0] += (np.random.random() - 0.5) * 0.01
-            player['velocity'][1] += (np.random.random() - 0.5) * 0.01
+        dy, dx = np.ogrid[y0 - py:y1 - py, x0 - px:x1 - px]
+        hits[i] = (rows[:, x0:x1] > threshold)[dx * dx + dy * dy <= radius * radius].any()
+    return hits
+
+# === TILED RENDER ===
+# With Tileworkers > 0, lava rendering and compositing are split into
+# horizontal bands - one per LED panel, sized by the Tilepanels weights - and
+# run on a pool of worker processes (hooks/fix_tiles.py). The output, base
+# and lava buffers then live in shared memory, so workers write straight into
+# the frame copyNumpyArray hands over. Bands go through the same row-offset
+# render code as the single-process path, so the pixels are identical.
+# Inside TouchDesigner, Tilepython must point at a Python matching
+# TouchDesigner's, since worker processes cannot be TouchDesigner itself.
+def scriptPath():
+    """This callbacks file on disk - the synced file of this DAT inside TouchDesigner"""
+    try:
+        return os.path.abspath(me.par.file.eval())
+    except:
+        return os.path.abspath(__file__)
+
+def getTiles(params, tex_size):
+    """Tile pool and band layout for this cook, or None to render in this process"""
+    if params.tile_workers <= 0 or storage.get('tilesFailed'):
+        return None
+    
+    pool = storage.get('tilePool')
+    if pool is None:
+        try:
+            script_path = scriptPath()
+            hooks_dir = os.path.dirname(script_path)
+            if hooks_dir not in sys.path:
+                sys.path.insert(0, hooks_dir)
+            import fix_tiles
             
-            # Limit max velocity
-            max_vel = 0.03
-            player['velocity'][0] = max(-max_vel, min(max_vel, player['velocity'][0]))
-            player['velocity'][1] = max(-max_vel, min(max_vel, player['velocity'][1]))
+            context = multiprocessing.get_context('spawn')
+            if params.tile_python:
+                context.set_executable(params.tile_python)
+            executor = ProcessPoolExecutor(max_workers=params.tile_workers, mp_context=context,
+                                           initializer=fix_tiles.initWorker, initargs=(script_path,))
+        except Exception as error:
+            print(f"⚠️ Tiled render unavailable ({error}), rendering in one process")
+            storage['tilesFailed'] = True
+            return None
+        
+        pool = {'executor': executor, 'module': fix_tiles, 'bands': None, 'layout': None}
+        storage['tilePool'] = pool
+        print(f"🧩 Tiled render on {params.tile_workers} worker processes")
+    
+    layout = (tex_size, params.tile_workers, params.tile_panels)
+    if pool['layout'] != layout:
+        pool['bands'] = tileBands(tex_size, params.tile_workers, params.tile_panels)
+        pool['layout'] = layout
+    return pool
 
-def checkPlayerScanCollisions(scanPositions, tex_size):
-    """Check if players are hit by scans"""
-    if 'players' not in storage['gameState']:
-        return
+def tileBands(tex_size, num_workers, panels):
+    """Row ranges (row0, row1) proportional to the comma-separated panel weights, else one per worker"""
+    try:
+        weights = [float(w) for w in panels.split(',') if w.strip()]
+    except ValueError:
+        weights = []
+    if not weights or min(weights) <= 0:
+        weights = [1.0] * num_workers
+    
+    edges = np.rint(np.cumsum([0.0] + weights) / sum(weights) * tex_size).astype(int)
+    return [(int(row0), int(row1)) for row0, row1 in zip(edges[:-1], edges[1:]) if row1 > row0]
+
+def runTiles(pool, buffers, job):
+    """Run one job on every band in the pool; False (and tiles disabled) if a worker failed
+    
+    job is the renderBands job each worker runs on its own band.
+    """
+    segments = {name: segment.name for name, segment in buffers['segments'].items()}
+    futures = [pool['executor'].submit(pool['module'].renderBand, segments, buffers['size'],
+                                       buffers['output'].dtype.str, band, job)
+               for band in pool['bands']]
+    try:
+        for future in futures:
+            future.result()
+    except Exception as error:
+        print(f"⚠️ Tile worker failed ({error}), rendering in one process")
+        storage['tilesFailed'] = True
+        shutdownTilePool(storage.pop('tilePool', None))
+        return False
+    return True
+
+def shutdownTilePool(pool):
+    if pool is not None:
+        pool['executor'].shutdown(wait=False, cancel_futures=True)
+
+# === KERNEL BACKEND ===
+# The union-find behind labelBlobs, the danger field's column scan and the
+# z-buffered sprite scatter are loops that NumPy can only express as several
+# whole-array passes. When Numba is importable they run as JIT-compiled loops
+# instead; each kernel below is plain Python over arrays and gives the same
+# result as the NumPy code it replaces, which stays the fallback. The
+# Kernels menu picks the backend and Kernelbackend reports the one in use.
+# Kernels are compiled and run once on tiny inputs (useKernels, called from
+# onSetupParameters) so the first game frame does not wait on compilation.
+# Compiled code is cached on disk next to the script (cache=True), so a
+# later session loads it instead of compiling again - onSetupParameters does
+# not run when a project loads, and without the cache every session would
+# compile in its first cook. A cold cache still compiles on that cook.
+KERNELS = {}  # Kernels in use by name - empty means the NumPy code runs
+kernelBackend = {'setting': None, 'compiled': None}
+
+def unionRunsKernel(num_runs, upper, lower):
+    """unionRuns as a sequential union-find - every root is the lowest run index in its blob"""
+    labels = np.arange(num_runs)
+    for i in range(len(upper)):
+        a = upper[i]
+        while labels[a] != a:
+            labels[a] = labels[labels[a]]
+            a = labels[a]
+        b = lower[i]
+        while labels[b] != b:
+            labels[b] = labels[labels[b]]
+            b = labels[b]
+        if a < b:
+            labels[b] = a
+        elif b < a:
+            labels[a] = b
+    
+    # Parents always have lower indices, so one forward pass flattens to roots
+    for i in range(num_runs):
+        labels[i] = labels[labels[i]]
+    return labels
+
+def dangerColumnsKernel(lava_intensity, threshold, field):
+    """buildDangerField's vertical pass in two row-order sweeps - threshold must be float32"""
+    height, width = lava_intensity.shape
+    nearest = np.full(width, -DANGER_NONE, dtype=np.int64)
+    for y in range(height):
+        for x in range(width):
+            if lava_intensity[y, x] > threshold:
+                nearest[x] = y
+            field[y, x] = y - nearest[x]
+    
+    nearest[:] = height + DANGER_NONE
+    for y in range(height - 1, -1, -1):
+        for x in range(width):
+            if lava_intensity[y, x] > threshold:
+                nearest[x] = y
+            if nearest[x] - y < field[y, x]:
+                field[y, x] = nearest[x] - y
+    return field
+
+def drawStampsKernel(output, centers, dy, dx, weights, colors, scale, bias):
+    """drawStamps' z-buffered scatter as stamps drawn in order - dy, dx are offsets of the disc pixels"""
+    height, width = output.shape[0], output.shape[1]
+    for i in range(len(centers)):
+        for k in range(len(dy)):
+            x = centers[i, 0] + dx[k]
+            y = centers[i, 1] + dy[k]
+            if x >= 0 and x < width and y >= 0 and y < height:
+                weight = weights[k] * scale
+                for c in range(3):
+                    output[y, x, c] = colors[i, c] * weight + bias
+
+KERNEL_SOURCES = {
+    'unionRuns': unionRunsKernel,
+    'dangerColumns': dangerColumnsKernel,
+    'drawStamps': drawStampsKernel,
+}
+
+def warmKernels(kernels):
+    """Run every kernel once on tiny inputs of the types onCook passes, forcing compilation"""
+    runs = np.zeros(1, dtype=np.intp)
+    kernels['unionRuns'](2, runs, runs + 1)
+    kernels['dangerColumns'](np.zeros((2, 2), dtype=np.float32), np.float32(0.5), np.zeros((2, 2), dtype=np.int16))
+    for dtype in (np.float32, np.uint8):
+        scale, bias = PIXEL_SCALES[np.dtype(dtype)]
+        kernels['drawStamps'](np.zeros((2, 2, 4), dtype=dtype), np.zeros((1, 2), dtype=np.intp), runs, runs,
+                              np.ones(1), np.ones((1, 3)), scale, bias)
+
+def jitKernel(source):
+    """numba.njit with the on-disk cache - uncached when the source has no file to cache beside"""
+    try:
+        return numba.njit(cache=True, nogil=True)(source)
+    except RuntimeError:
+        # Numba refuses to cache code compiled from a string with no file behind it
+        return numba.njit(nogil=True)(source)
+
+def compileKernels():
+    """JIT-compiled kernels, built and warmed once per script load - {} without Numba or if that fails"""
+    if kernelBackend['compiled'] is None:
+        kernelBackend['compiled'] = {}
+        if numba is not None:
+            try:
+                compiled = {name: jitKernel(source) for name, source in KERNEL_SOURCES.items()}
+                warmKernels(compiled)
+                kernelBackend['compiled'] = compiled
+            except Exception as error:
+                print(f"⚠️ Numba kernels failed to compile ({error}), using NumPy")
+    return kernelBackend['compiled']
+
+def useKernels(scriptOp, setting):
+    """Switch KERNELS to the Kernels menu setting and report the active backend"""
+    KERNELS.clear()
+    if setting != 'numpy':
+        KERNELS.update(compileKernels())
+    kernelBackend['setting'] = setting
+    
+    backend = f"numba {numba.__version__}" if KERNELS else 'numpy'
+    try:
+        scriptOp.par.Kernelbackend = backend
+    except:
+        pass
+    return backend
+
+# === LAYER CACHE ===
+# The frame is a cached base (coloured lava with safe zones on top) under the
+# sprites drawn each cook. Each cached layer remembers the key it was built
+# from - a tuple of the time-derived positions, parameters and game state it
+# depends on - and is dirty only when that key changes, so a scene where
+# nothing moves costs almost nothing to cook.
+SAFE_ZONE_COLOR = (0.0, 0.8, 0.2)
+SAFE_ZONE_CORE_GREEN = 1.0
+
+def getLayer(name, key):
+    """Cached value of a layer if it was built from key, else None (dirty)"""
+    entry = storage.setdefault('layers', {}).get(name)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    return None
+
+def setLayer(name, key, value):
+    """Store a rebuilt layer along with the key it was built from"""
+    storage.setdefault('layers', {})[name] = (key, value)
+    return value
+
+def layoutSafeZones(time, tex_size, num_safe_zones, safe_size, safe_move):
+    """Clipped safe zone rectangles, each zone's brighter core rectangle (or None), and centres for parameter exposure
     
-    scanner_width = 30  # Default scanner width
+    Fixed zones come from a private RandomState(42) so placing them no longer
+    reseeds the global NumPy generator.
+    """
+    rng = np.random.RandomState(42)
+    zones = []
+    cores = []
+    centers = []
     
-    for scan_pos, scan_type in scanPositions:
-        for pid, player in storage['gameState']['players'].items():
-            if not player['isAlive']:
-                continue
-            
-            player_x = player['position'][0] * tex_size
-            player_y = player['position'][1] * tex_size
-            
-            hit = False
+    for i in range(num_safe_zones):
+        if safe_move:
+            safe_x = int((np.sin(time * 0.3 + i * 2) * 0.3 + 0.5) * (tex_size - safe_size))
+            safe_y = int((np.cos(time * 0.25 + i * 1.5) * 0.3 + 0.5) * (tex_size - safe_size))
+        else:
+            safe_x = int(rng.random_sample() * (tex_size - safe_size))
+            safe_y = int(rng.random_sample() * (tex_size - safe_size))
+        
+        x_start = max(0, safe_x)
+        x_end = min(tex_size, safe_x + safe_size)
+        y_start = max(0, safe_y)
+        y_end = min(tex_size, safe_y + safe_size)
+        
+        if x_start < x_end and y_start < y_end:
+            # Store safe zone boundaries
+            zones.append((x_start, x_end, y_start, y_end))
+            # Store normalized center position for parameter exposure
+            center_x = (x_start + x_end) / 2.0 / tex_size
+            center_y = (y_start + y_end) / 2.0 / tex_size
+            centers.append({
+                'x': round(center_x, 3), 
+                'y': round(center_y, 3), 
+                'id': i,
+                'pixel_x': (x_start + x_end) // 2,
+                'pixel_y': (y_start + y_end) // 2
+            })
             
-            if scan_type == 'horizontal':
-                if abs(player_y - scan_pos) < scanner_width:
-                    hit = True
-            elif scan_type == 'vertical':
-                if abs(player_x - scan_pos) < scanner_width:
-                    hit = True
+            center_size = safe_size // 3
+            cx = safe_x + safe_size // 2 - center_size // 2
+            cy = safe_y + safe_size // 2 - center_size // 2
+            cx_start = max(0, cx)
+            cx_end = min(tex_size, cx + center_size)
+            cy_start = max(0, cy)
+            cy_end = min(tex_size, cy + center_size)
             
-            if hit:
-                # Check if player color matches danger color
-                if player['color'] == storage['gameState']['currentDangerColor']:
-                    player['isAlive'] = False
-                    print(f"💀 Player {pid} (color {player['color']}) was eliminated!")
-                else:
-                    player['score'] += 1
+            if cx_start < cx_end and cy_start < cy_end:
+                cores.append((cx_start, cx_end, cy_start, cy_end))
+            else:
+                cores.append(None)
+    
+    return zones, cores, centers
 
-def onCook(scriptOp):
-    # Get parameters
+def composeBase(base, lava_intensity, lava_color, zones, cores, scratch, row0=0):
+    """Coloured lava with the safe zones painted over it (alpha stays 1 from allocation)
+    
+    base and lava_intensity may be a band of rows starting at row0; zones are
+    in full-frame pixels and clipped to the band. This is the colour pass that
+    quantizes into base's pixel format; scratch is float32 space for one band
+    channel, only needed for integer formats.
+    """
+    scale, bias = PIXEL_SCALES[base.dtype]
+    for channel, value in enumerate(lava_color):
+        if bias:
+            scaled = scratchView(scratch, lava_intensity.shape)
+            np.multiply(lava_intensity, min(max(value, 0.0), 1.0) * scale, out=scaled)
+            np.add(scaled, bias, out=base[:, :, channel], casting='unsafe')
+        else:
+            np.multiply(lava_intensity, value, out=base[:, :, channel], casting='unsafe')
+    
+    zone_color = pixelColor(SAFE_ZONE_COLOR, base.dtype)
+    core_green = pixelColor(SAFE_ZONE_CORE_GREEN, base.dtype)
+    
+    row1 = row0 + base.shape[0]
+    
+    # Zone by zone, so a later zone still paints over an earlier zone's core
+    for (x_start, x_end, y_start, y_end), core in zip(zones, cores):
+        y_start, y_end = max(y_start, row0), min(y_end, row1)
+        if y_start < y_end:
+            base[y_start - row0:y_end - row0, x_start:x_end, :3] = zone_color
+        if core is not None:
+            cx_start, cx_end, cy_start, cy_end = core
+            cy_start, cy_end = max(cy_start, row0), min(cy_end, row1)
+            if cy_start < cy_end:
+                base[cy_start - row0:cy_end - row0, cx_start:cx_end, 1] = core_green
+
+# === FUSED BANDS ===
+# Lava, colour and blit each used to sweep the whole frame in turn, so at
+# 1024+ every pass streamed megabytes back in from main memory that the pass
+# before had just pushed out. Walking the frame in bands of about
+# FUSED_BAND_PIXELS pixels and running all three passes on one band before
+# moving on keeps the lava rows and base pixels in cache between passes. The
+# 1D profiles every effect reads are built once per cook (lavaProfiles), and
+# each effect already clips itself to the rows it reaches, so bands a burst
+# or the diagonal never touch skip that effect outright. Whole bands are not
+# skipped: any vertical scanner crosses every band, and the scanner max and
+# colour pass must rewrite the reused buffers anyway. Each band costs a few
+# dozen NumPy calls, which outweighs the traffic saved until the frame is
+# larger than FUSED_MIN_PIXELS - smaller frames stay one band. A
+# FUSED_MIN_PIXELS above the frame size is the per-layer order (each pass
+# over the whole frame); bench_fix.py --fused-min-pixels sets it to compare.
+FUSED_BAND_PIXELS = 1 << 16
+FUSED_MIN_PIXELS = 1 << 21
+
+def fusedBandRows(tex_size, num_rows):
+    """Rows per fused band when renderBands walks num_rows rows of a tex_size frame"""
+    if tex_size * tex_size <= FUSED_MIN_PIXELS:
+        return num_rows
+    return min(num_rows, max(8, FUSED_BAND_PIXELS // tex_size))
+
+def renderBands(output, base, lava_intensity, row0, row1, job, scratch):
+    """Run a lava/compose/blit job on rows row0:row1, one cache-sized band at a time
+    
+    job is the same dict runTiles hands to tile workers: 'lava' is
+    (profiles, scanner_width, diag_pos, wave_pos, burst_centers) or None,
+    'compose' is (lava_color, zones, cores) or None and 'blit' copies base
+    to output. scratch is float32 space for one band (fusedBandRows rows).
+    """
+    tex_size = output.shape[1]
+    band_rows = fusedBandRows(tex_size, row1 - row0)
+    geometry = getGeometry(tex_size) if job['lava'] is not None else None
+    
+    for y0 in range(row0, row1, band_rows):
+        y1 = min(y0 + band_rows, row1)
+        if job['lava'] is not None:
+            profiles, scanner_width, diag_pos, wave_pos, burst_centers = job['lava']
+            renderLavaRows(lava_intensity[y0:y1], y0, geometry, profiles, scanner_width, diag_pos, wave_pos,
+                           burst_centers, scratch)
+        if job['compose'] is not None:
+            composeBase(base[y0:y1], lava_intensity[y0:y1], *job['compose'], scratch, y0)
+        if job['blit']:
+            np.copyto(output[y0:y1], base[y0:y1])
+
+# === STRUCTURED EXPORT ===
+# Safe zones and detected circles are published as fixed-layout record arrays
+# in storage['exports'] rather than as str() reprs that every consumer had to
+# parse back. Both are offered every cook, but an export is only republished
+# when its records change: its version goes up, and the Table DAT, the shared
+# memory block and the legacy string parameters are rewritten. A Table DAT
+# assigned since the last write is filled on its first cook either way.
+#
+# A Script CHOP can turn an export into channels:
+#     for name, vals in op('script1').module.exportChannels('circles').items(): ...
+# Shared memory blocks are named <Exportprefix>_<export> and hold an
+# EXPORT_HEADER_DTYPE header followed by EXPORT_CAPACITY records. The version
+# is odd while a write is in progress, so a reader that sees the same even
+# version before and after copying has a consistent snapshot.
+EXPORT_CAPACITY = 256
+EXPORT_HEADER_DTYPE = np.dtype([('version', '<u8'), ('count', '<u4'), ('capacity', '<u4')])
+EXPORT_DTYPES = {
+    'safeZones': np.dtype([('id', '<i4'), ('x', '<f8'), ('y', '<f8'), ('pixel_x', '<i4'), ('pixel_y', '<i4')]),
+    'circles': np.dtype([('id', '<i4'), ('x', '<f8'), ('y', '<f8'), ('px', '<i4'), ('py', '<i4'),
+                         ('radius', '<f4'), ('colliding', '?'), ('safe', '?'), ('danger', '<f4')]),
+}
+EXPORT_TABLE_PARAMS = {'safeZones': 'Safezonetable', 'circles': 'Circletable'}
+
+def safeZoneRecords(safe_zone_centers):
+    records = np.zeros(len(safe_zone_centers), dtype=EXPORT_DTYPES['safeZones'])
+    for i, zone in enumerate(safe_zone_centers):
+        records[i] = (zone['id'], zone['x'], zone['y'], zone['pixel_x'], zone['pixel_y'])
+    return records
+
+def circleRecords(circles, circle_collisions):
+    records = np.zeros(len(circles), dtype=EXPORT_DTYPES['circles'])
+    for i, circle in enumerate(circles):
+        info = circle_collisions.get(circle['id'], {})
+        records[i] = (circle['id'], circle['norm_x'], circle['norm_y'], circle['pixel_x'], circle['pixel_y'],
+                      circle['radius'], info.get('colliding', False), info.get('in_safe_zone', False),
+                      info.get('danger_distance', np.inf))
+    return records
+
+def publishExport(scriptOp, params, name, records):
+    """Store an export and push it to its outputs - True if the records changed
+    
+    Unchanged records are only written to a Table DAT that has not had them yet.
+    """
+    exports = storage.setdefault('exports', {})
+    current = exports.get(name)
+    table = exportTable(scriptOp, name)
+    if current is not None and np.array_equal(current['records'], records):
+        if table is not None and table != current['table']:
+            writeExportTable(table, records)
+            current['table'] = table
+        return False
+    
+    version = current['version'] + 1 if current is not None else 1
+    exports[name] = {'records': records, 'version': version, 'table': table}
+    
+    if table is not None:
+        writeExportTable(table, records)
+    if params.export_shm:
+        writeExportBlock(params.export_prefix, name, records, version)
+    if params.legacy_strings:
+        writeLegacyStrings(scriptOp, name, records)
+    return True
+
+def exportChannels(name):
+    """One float32 array per field of an export - what a Script CHOP needs to build channels"""
+    export = storage.get('exports', {}).get(name)
+    dtype = EXPORT_DTYPES[name]
+    records = export['records'] if export is not None else np.zeros(0, dtype=dtype)
+    return {field: records[field].astype(np.float32) for field in dtype.names}
+
+def exportTable(scriptOp, name):
+    """The Table DAT an export is written to, or None"""
     try:
-        game_speed = scriptOp.par.Gamespeed.eval()
-        resolution = scriptOp.par.Resolution.eval()
-        num_h_scanners = scriptOp.par.Numhscanners.eval()
-        num_v_scanners = scriptOp.par.Numvscanners.eval()
-        scanner_width = scriptOp.par.Scannerwidth.eval()
-        scan_speed = scriptOp.par.Scanspeed.eval()
-        scan_pulse = scriptOp.par.Scanpulse.eval()
-        num_safe_zones = scriptOp.par.Numsafezones.eval()
-        safe_size = scriptOp.par.Safesize.eval()
-        safe_move = scriptOp.par.Safemove.eval()
-        diagonal_scan = scriptOp.par.Diagonalscan.eval()
-        circular_scan = scriptOp.par.Circularscan.eval()
-        burst_count = scriptOp.par.Burstcount.eval()
-        lava_r = scriptOp.par.Lavar.eval()
-        lava_g = scriptOp.par.Lavag.eval()
-        lava_b = scriptOp.par.Lavab.eval()
-        collision_threshold = scriptOp.par.Collisionthreshold.eval()
-        debug_mode = scriptOp.par.Debugmode.eval()
+        table = getattr(scriptOp.par, EXPORT_TABLE_PARAMS[name]).eval()
     except:
-        # Defaults
-        game_speed = 1.0
-        resolution = 256
-        num_h_scanners = 2
-        num_v_scanners = 2
-        scanner_width = 30
-        scan_speed = 1.0
-        scan_pulse = True
-        num_safe_zones = 8
-        safe_size = 40
-        safe_move = True
-        diagonal_scan = True
-        circular_scan = True
-        burst_count = 3
-        lava_r = 1.0
-        lava_g = 0.2
-        lava_b = 0.0
-        collision_threshold = 0.3
-        debug_mode = False
+        table = None
+    return table or None
+
+def writeExportTable(table, records):
+    table.clear()
+    table.appendRow(list(records.dtype.names))
+    for record in records.tolist():
+        table.appendRow([int(value) if isinstance(value, bool) else value for value in record])
+
+def writeExportBlock(prefix, name, records, version):
+    """Copy an export into its shared memory block, creating the block on first use"""
+    blocks = storage.setdefault('exportBlocks', {})
+    block = blocks.get(name)
+    if block is None:
+        size = EXPORT_HEADER_DTYPE.itemsize + EXPORT_CAPACITY * EXPORT_DTYPES[name].itemsize
+        block_name = f"{prefix}_{name}"
+        try:
+            block = shared_memory.SharedMemory(name=block_name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by an earlier session - reuse it if it is big enough
+            block = shared_memory.SharedMemory(name=block_name)
+            if block.size < size:
+                block.close()
+                block.unlink()
+                block = shared_memory.SharedMemory(name=block_name, create=True, size=size)
+        except Exception as error:
+            print(f"⚠️ Shared memory export unavailable ({error})")
+            return
+        blocks[name] = block
+    
+    header = np.ndarray(1, dtype=EXPORT_HEADER_DTYPE, buffer=block.buf)[0]
+    body = np.ndarray(EXPORT_CAPACITY, dtype=EXPORT_DTYPES[name], buffer=block.buf,
+                      offset=EXPORT_HEADER_DTYPE.itemsize)
+    count = min(len(records), EXPORT_CAPACITY)
+    
+    header['version'] = 2 * version - 1  # Odd - write in progress
+    body[:count] = records[:count]
+    header['count'] = count
+    header['capacity'] = EXPORT_CAPACITY
+    header['version'] = 2 * version
+
+def releaseExportBlocks(blocks):
+    for block in blocks.values():
+        try:
+            block.close()
+            block.unlink()
+        except Exception:
+            pass
+
+def writeLegacyStrings(scriptOp, name, records):
+    """The old str() parameters, for networks that still parse them"""
+    try:
+        rows = [dict(zip(records.dtype.names, row)) for row in records.tolist()]
+        if name == 'safeZones':
+            scriptOp.par.Safezonelocations = str([
+                {'x': round(r['x'], 3), 'y': round(r['y'], 3), 'id': r['id'],
+                 'pixel_x': r['pixel_x'], 'pixel_y': r['pixel_y']}
+                for r in rows
+            ])
+        else:
+            scriptOp.par.Circlepositions = str([
+                {'id': r['id'], 'x': round(r['x'], 3), 'y': round(r['y'], 3), 'px': r['px'], 'py': r['py']}
+                for r in rows
+            ])
+            scriptOp.par.Collisionstatus = str({
+                f"circle_{r['id']}": {'colliding': r['colliding'], 'safe': r['safe']} for r in rows
+            })
+    except:
+        pass
+
+# === FRAME BUFFER POOL ===
+def getFrameBuffers(tex_size, shared=False, pixel_format='float32'):
+    """Output canvas, cached base layer, lava intensity and scratch space for one resolution
+    
+    The output and base alpha channels are set to 1 once here; cooks only
+    ever rewrite RGB. Everything is reallocated only when Resolution or
+    Outputformat changes or the frame moves in or out of shared memory for
+    tiled rendering.
+    """
+    dtype = OUTPUT_FORMATS.get(pixel_format, np.float32)
+    buffers = storage.get('frameBuffers')
+    if (buffers is not None and buffers['size'] == tex_size and bool(buffers['segments']) == shared
+            and buffers['output'].dtype == dtype):
+        return buffers
+    if buffers is not None:
+        releaseFrameBuffers(buffers)
+    
+    # Layers cached in the old buffers went with them
+    storage.pop('layers', None)
+    
+    segments = {}
+    output = allocFrameArray(segments, 'output', (tex_size, tex_size, 4), dtype, shared)
+    output[:, :, :3] = 0
+    output[:, :, 3] = pixelColor(1.0, dtype)
+    base = allocFrameArray(segments, 'base', (tex_size, tex_size, 4), dtype, shared)
+    np.copyto(base, output)
+    
+    buffers = {
+        'size': tex_size,
+        'segments': segments,
+        'output': output,
+        'base': base,
+        'lava': allocFrameArray(segments, 'lava', (tex_size, tex_size), 'float32', shared),
+        'scratch': np.empty(tex_size * tex_size, dtype='float32'),
+        'index_scratch': np.empty(tex_size * tex_size, dtype=np.intp)
+    }
+    storage['frameBuffers'] = buffers
+    return buffers
+
+def allocFrameArray(segments, name, shape, dtype, shared):
+    """Uninitialised frame array, backed by a new shared memory block (kept in segments) when shared"""
+    if not shared:
+        return np.empty(shape, dtype=dtype)
+    segment = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    segments[name] = segment
+    return np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+def releaseFrameBuffers(buffers):
+    """Free the shared memory behind a frame buffer set that is being replaced"""
+    segments = buffers.get('segments', {})
+    buffers.clear()
+    for segment in segments.values():
+        try:
+            segment.close()
+        except BufferError:
+            pass  # Still viewed somewhere - closed when garbage collected
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+# How to free storage caches that own more than memory when a parameter drops them
+CACHE_RELEASERS = {
+    'frameBuffers': releaseFrameBuffers,
+    'tilePool': shutdownTilePool,
+    'exportBlocks': releaseExportBlocks,
+}
+
+def scratchView(scratch, shape):
+    """Contiguous array of the given shape carved from the start of a flat scratch buffer"""
+    return scratch[:int(np.prod(shape))].reshape(shape)
+
+# === GEOMETRY CACHE ===
+# Two sizes are in use at once when lava is rendered reduced: the reduced
+# field and the full frame that probeLava renders rows of.
+GEOMETRY_CACHE_SIZE = 2
+
+def getGeometry(tex_size):
+    """Coordinate axes and distance lookups for one resolution, rebuilt only when Resolution changes
+    
+    Holds the 1D x/y axes (broadcastable as a row and a column), the x + y
+    axis of the diagonal scanner, and every pixel's distance from the centre
+    as an index into radial samples spaced 1 / FALLOFF_SAMPLES_PER_PIXEL
+    apart. The arrays are shared between cooks and must never be written.
+    """
+    cache = storage.setdefault('geometry', OrderedDict())
+    geometry = cache.get(tex_size)
+    if geometry is not None:
+        cache.move_to_end(tex_size)
+        return geometry
+    
+    axis = np.arange(tex_size, dtype=np.float32)
+    x_axis = axis[None, :]
+    y_axis = axis[:, None]
+    center = tex_size // 2
+    
+    radial = np.sqrt((x_axis - center)**2 + (y_axis - center)**2)
+    radial_index = np.rint(radial * FALLOFF_SAMPLES_PER_PIXEL).astype(np.intp)
+    num_radial = int(radial_index.max()) + 1
+    
+    geometry = {
+        'size': tex_size,
+        'x_axis': x_axis,
+        'y_axis': y_axis,
+        'diagonal_axis': np.arange(2 * tex_size - 1, dtype=np.float32),
+        'radial_index': radial_index,
+        'radial_samples': np.arange(num_radial, dtype=np.float32) / FALLOFF_SAMPLES_PER_PIXEL
+    }
+    # radial_index stays writeable: np.take copies read-only index arrays
+    for field in ('x_axis', 'y_axis', 'diagonal_axis', 'radial_samples'):
+        geometry[field].setflags(write=False)
+    
+    cache[tex_size] = geometry
+    if len(cache) > GEOMETRY_CACHE_SIZE:
+        cache.popitem(last=False)
+    return geometry
+
+def drawStamps(output, centers, radius, falloff, colors, index_scratch):
+    """Write many same-size disc stamps - centers is (N, 2) x, y and colors is (N, 3)
+    
+    Later stamps win where discs overlap, as if drawn one after another. A few
+    stamps are blitted one by one; crowds go through a z-buffer in
+    index_scratch holding the last stamp covering each pixel, so every
+    output pixel is written once however much the discs overlap.
+    """
+    if len(centers) < STAMP_BATCH_MIN:
+        for (px, py), color in zip(centers, colors):
+            drawStamp(output, int(px), int(py), radius, falloff, color)
+        return
+    
+    height, width = output.shape[:2]
+    intensity, inside = getStamp(radius, falloff)
+    dy, dx = np.nonzero(inside[:, :, 0])
+    
+    # Numba has no float16 arrays
+    kernel = KERNELS.get('drawStamps')
+    if kernel is not None and output.dtype != np.float16:
+        scale, bias = PIXEL_SCALES[output.dtype]
+        kernel(output, centers, dy - radius, dx - radius, intensity[dy, dx, 0], colors, scale, bias)
+        return
+    
+    xs = centers[:, 0:1] + (dx - radius)
+    ys = centers[:, 1:2] + (dy - radius)
+    visible = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    owner = np.broadcast_to(np.arange(len(centers))[:, None], xs.shape)
+    
+    winner = index_scratch[:height * width]
+    winner.fill(-1)
+    np.maximum.at(winner, (ys * width + xs)[visible], owner[visible])
+    
+    pixels = np.flatnonzero(winner >= 0)
+    stamp = winner[pixels]
+    py, px = np.divmod(pixels, width)
+    weights = intensity[py - centers[stamp, 1] + radius, px - centers[stamp, 0] + radius, 0]
+    scale, bias = PIXEL_SCALES[output.dtype]
+    output.reshape(-1, output.shape[2])[pixels, :3] = colors[stamp] * (weights[:, None] * scale) + bias
+
+def onCook(scriptOp):
+    profile = startProfile(storage.get('params'))
+    
+    # Get parameters - the snapshot is only re-read after a change
+    params = getParams(scriptOp)
+    game_speed = params.game_speed
+    resolution = params.resolution
+    num_h_scanners = params.num_h_scanners
+    num_v_scanners = params.num_v_scanners
+    scanner_width = params.scanner_width
+    scan_speed = params.scan_speed
+    scan_pulse = params.scan_pulse
+    num_safe_zones = params.num_safe_zones
+    safe_size = params.safe_size
+    safe_move = params.safe_move
+    diagonal_scan = params.diagonal_scan
+    circular_scan = params.circular_scan
+    burst_count = params.burst_count
+    lava_r = params.lava_r
+    lava_g = params.lava_g
+    lava_b = params.lava_b
+    collision_threshold = params.collision_threshold
+    debug_mode = params.debug_mode
+    
+    # Auto quality times the whole cook and may switch effects off for now
+    cook_start = perf_counter_ns() if params.auto_quality else 0
+    if not params.auto_quality:
+        resetGovernor(scriptOp)
+    quality = getQuality(params)
+    diagonal_scan = diagonal_scan and quality['diagonal']
+    circular_scan = circular_scan and quality['circular']
+    if not quality['bursts']:
+        burst_count = 0
+    
+    # Kernel backend follows the Kernels menu
+    if params.kernels != kernelBackend['setting']:
+        useKernels(scriptOp, params.kernels)
+    
+    if profile:
+        profileLap(profile, 'params')
     
     # Use resolution parameter
     tex_size = resolution
@@ -508,12 +2605,8 @@ def onCook(scriptOp):
         # Update color change timer
         gameState['timeUntilChange'] -= deltaTime
         if gameState['timeUntilChange'] <= 0:
-            try:
-                numColors = scriptOp.par.Numcolors.eval()
-                changeTime = scriptOp.par.Colorchangetime.eval()
-            except:
-                numColors = 4
-                changeTime = 10.0
+            numColors = params.num_colors
+            changeTime = params.color_change_time
             
             # Change to new danger color
             oldColor = gameState['currentDangerColor']
@@ -535,179 +2628,139 @@ def onCook(scriptOp):
             lava_g = min(1.0, lava_g + flash)
             lava_b = min(1.0, lava_b + flash)
     
+    if profile:
+        profileLap(profile, 'game')
+    
     # Get time
     time = absTime.seconds * game_speed
     
-    # Create canvas with specified resolution
-    output = np.zeros((tex_size, tex_size, 4), dtype='float32')
-    output[:, :, 3] = 1.0
+    # Canvas, lava intensity and scratch space are reused from cook to cook
+    tiles = getTiles(params, tex_size)
+    buffers = getFrameBuffers(tex_size, shared=tiles is not None, pixel_format=params.output_format)
+    output = buffers['output']
+    base = buffers['base']
+    lava_intensity = buffers['lava']
+    index_scratch = buffers['index_scratch']
     
-    # Create coordinate grids
-    y_grid, x_grid = np.ogrid[:tex_size, :tex_size]
+    # Where every scanner is this cook - cheap scalars that also key the lava layer
+    scanner_beams = scannerBeams(time, tex_size, num_h_scanners, num_v_scanners, scan_speed, scan_pulse)
+    scan_positions = [(scan_pos, scan_type) for scan_pos, scan_type, pulse in scanner_beams]
     
-    # Initialize lava intensity
-    lava_intensity = np.zeros((tex_size, tex_size), dtype='float32')
+    diag_pos = None
+    if diagonal_scan:
+        diag_pos = (time * scan_speed * 100) % (tex_size * 2)
+        scan_positions.append((diag_pos, 'diagonal'))
     
-    # Track scan positions for collision detection
-    scan_positions = []
+    wave_pos = None
+    if circular_scan:
+        wave_pos = (time * scan_speed * 50) % (tex_size // 2)
+        scan_positions.append((wave_pos, 'ring'))
     
-    # HORIZONTAL SCANNERS
-    if num_h_scanners > 0:
-        for i in range(num_h_scanners):
-            phase = (i / max(num_h_scanners, 1)) * np.pi * 2
-            scan_pos = (np.sin(time * scan_speed + phase) * 0.4 + 0.5) * tex_size
-            scan_positions.append((scan_pos, 'horizontal'))
-            
-            pulse = 1.0
-            if scan_pulse:
-                pulse = np.sin(time * 5 + i) * 0.2 + 0.8
-            
-            distance = np.abs(y_grid - scan_pos)
-            beam = np.exp(-(distance**2) / (scanner_width**2)) * pulse
-            lava_intensity = np.maximum(lava_intensity, beam)
-    
-    # VERTICAL SCANNERS - Fixed to render as vertical lines
-    if num_v_scanners > 0:
-        for i in range(num_v_scanners):
-            phase = (i / max(num_v_scanners, 1)) * np.pi * 2
-            scan_pos = (np.cos(time * scan_speed * 0.8 + phase) * 0.4 + 0.5) * tex_size
-            scan_positions.append((scan_pos, 'vertical'))
-            
-            pulse = 1.0
-            if scan_pulse:
-                pulse = np.sin(time * 4.5 + i * 2) * 0.2 + 0.8
-            
-            distance = np.abs(x_grid - scan_pos)
-            beam = np.exp(-(distance**2) / (scanner_width**2)) * pulse
-            # No transpose - vertical line runs along y-axis at fixed x
-            lava_intensity = np.maximum(lava_intensity, beam)
+    burst_centers = []
+    if burst_count > 0:
+        burst_centers = burstCenters(time, burst_count, tex_size, scanner_width)
+    
+    # LAVA LAYER - only re-rendered when a beam, wave or burst has changed
+    lava_scale = lavaScale(params.lava_resolution, scanner_width, tex_size, quality['lava_scale'])
+    lava_key = (tex_size, lava_scale, scanner_width, tuple(scanner_beams), tuple(scan_positions), tuple(burst_centers))
+    lava_args = (scanner_beams, scanner_width, diag_pos, wave_pos, burst_centers)
+    lava_job = None
+    reduced_lava = False
+    if getLayer('lava', lava_key) is None:
+        # Lava is rendered with the base below - full resolution band by band along with the compositing
+        if lava_scale > 1:
+            reduced_lava = True
+        else:
+            profiles = lavaProfiles(getGeometry(tex_size), scanner_beams, scanner_width, diag_pos, wave_pos)
+            lava_job = (profiles, scanner_width, diag_pos, wave_pos, burst_centers)
+        setLayer('lava', lava_key, lava_intensity)
     
     # Check collisions if game is running
     if gameState.get('isRunning', False):
-        checkPlayerScanCollisions(scan_positions, tex_size)
+        checkPlayerScanCollisions(scan_positions, tex_size, scanner_width)
         storage['gameState']['scanPositions'] = scan_positions
     
-    # DIAGONAL SCANNER
-    if diagonal_scan:
-        diag_pos = (time * scan_speed * 100) % (tex_size * 2)
-        diag_dist = np.abs((x_grid + y_grid) - diag_pos)
-        diag_beam = np.exp(-(diag_dist**2) / (scanner_width * 2)**2) * 0.7
-        lava_intensity = np.maximum(lava_intensity, diag_beam)
+    if profile:
+        profileLap(profile, 'scanners')
+    
+    # SAFE ZONES - fixed zones are laid out once per parameter change, moving ones every cook
+    safe_key = (tex_size, num_safe_zones, safe_size, safe_move)
+    safe_layout = None if safe_move else getLayer('safeZones', safe_key)
+    if safe_layout is None:
+        safe_layout = setLayer('safeZones', safe_key,
+                               layoutSafeZones(time, tex_size, num_safe_zones, safe_size, safe_move))
+    safe_zone_list, safe_zone_cores, safe_zone_centers = safe_layout
+    
+    # BASE LAYER - coloured lava and safe zones, recomposed only when either changes
+    lava_color = (lava_r, lava_g, lava_b)
+    base_key = (lava_key, lava_color, tuple(safe_zone_list))
+    base_dirty = getLayer('base', base_key) is None
+    compose_job = None
+    if base_dirty:
+        compose_job = (lava_color, safe_zone_list, safe_zone_cores)
+        setLayer('base', base_key, base)
+    
+    # Safe zone locations for exposure - a reference to the cached layout, so Reset never leaves them empty
+    storage['gameState']['safeZoneLocations'] = safe_zone_centers
     
-    # CIRCULAR WAVE
-    if circular_scan:
-        center = tex_size // 2
-        wave_pos = (time * scan_speed * 50) % (tex_size // 2)
-        dist_from_center = np.sqrt((x_grid - center)**2 + (y_grid - center)**2)
-        ring_dist = np.abs(dist_from_center - wave_pos)
-        ring = np.exp(-(ring_dist**2) / (scanner_width**2)) * 0.6
-        lava_intensity = np.maximum(lava_intensity, ring)
+    # Offered every cook, so outputs switched on in a static scene still get the zones
+    if publishExport(scriptOp, params, 'safeZones', safeZoneRecords(safe_zone_centers)):
+        try:
+            scriptOp.par.Numsafezonesfound = len(safe_zone_centers)
+        except:
+            pass
     
-    # RANDOM BURSTS
-    if burst_count > 0:
-        np.random.seed(int(time * 2))
-        for i in range(min(burst_count, 3)):
-            burst_x = np.random.randint(scanner_width, tex_size - scanner_width)
-            burst_y = np.random.randint(scanner_width, tex_size - scanner_width)
-            
-            dist = np.sqrt((x_grid - burst_y)**2 + (y_grid - burst_x)**2)
-            burst = np.exp(-(dist**2) / (scanner_width**2)) * 0.8
-            lava_intensity = np.maximum(lava_intensity, burst)
+    # Blit the base only if it changed or last cook's sprites have to be erased
+    blit = base_dirty or storage.get('spritesDrawn', True)
     
-    # Apply lava color
-    output[:, :, 0] = lava_intensity * lava_r
-    output[:, :, 1] = lava_intensity * lava_g
-    output[:, :, 2] = lava_intensity * lava_b
+    if reduced_lava:
+        renderLava(lava_intensity, buffers, lava_scale, *lava_args)
     
-    # SAFE ZONES - Track locations
-    safe_zone_list = []
-    safe_zone_centers = []
+    band_job = {'lava': lava_job, 'compose': compose_job, 'blit': blit}
+    if tiles is not None and (lava_job or compose_job or blit):
+        if not runTiles(tiles, buffers, band_job):
+            tiles = None
+    if tiles is None and (lava_job or compose_job or blit):
+        renderBands(output, base, lava_intensity, 0, tex_size, band_job, buffers['scratch'])
     
-    np.random.seed(42)
-    for i in range(num_safe_zones):
-        if safe_move:
-            safe_x = int((np.sin(time * 0.3 + i * 2) * 0.3 + 0.5) * (tex_size - safe_size))
-            safe_y = int((np.cos(time * 0.25 + i * 1.5) * 0.3 + 0.5) * (tex_size - safe_size))
-        else:
-            safe_x = int(np.random.random() * (tex_size - safe_size))
-            safe_y = int(np.random.random() * (tex_size - safe_size))
-        
-        x_start = max(0, safe_x)
-        x_end = min(tex_size, safe_x + safe_size)
-        y_start = max(0, safe_y)
-        y_end = min(tex_size, safe_y + safe_size)
-        
-        if x_start < x_end and y_start < y_end:
-            # Store safe zone boundaries
-            safe_zone_list.append((x_start, x_end, y_start, y_end))
-            # Store normalized center position for parameter exposure
-            center_x = (x_start + x_end) / 2.0 / tex_size
-            center_y = (y_start + y_end) / 2.0 / tex_size
-            safe_zone_centers.append({
-                'x': round(center_x, 3), 
-                'y': round(center_y, 3), 
-                'id': i,
-                'pixel_x': (x_start + x_end) // 2,
-                'pixel_y': (y_start + y_end) // 2
-            })
-            
-            output[y_start:y_end, x_start:x_end, 0] = 0.0
-            output[y_start:y_end, x_start:x_end, 1] = 0.8
-            output[y_start:y_end, x_start:x_end, 2] = 0.2
-            
-            center_size = safe_size // 3
-            cx = safe_x + safe_size // 2 - center_size // 2
-            cy = safe_y + safe_size // 2 - center_size // 2
-            cx_start = max(0, cx)
-            cx_end = min(tex_size, cx + center_size)
-            cy_start = max(0, cy)
-            cy_end = min(tex_size, cy + center_size)
-            
-            if cx_start < cx_end and cy_start < cy_end:
-                output[cy_start:cy_end, cx_start:cx_end, 1] = 1.0
-    
-    # Update safe zone locations in storage and parameters
-    storage['gameState']['safeZoneLocations'] = safe_zone_centers
-    try:
-        scriptOp.par.Safezonelocations = str(safe_zone_centers)
-        scriptOp.par.Numsafezonesfound = len(safe_zone_centers)
-    except:
-        pass
+    if profile:
+        profileLap(profile, 'render')
     
     # === DETECT MULTIPLE CIRCLES/PLAYERS FROM INPUT ===
-    detected_circles = detectMultipleCircles(scriptOp, tex_size)
+    detected_circles = detectMultipleCircles(scriptOp, tex_size, params, quality)
     storage['gameState']['detectedCircles'] = detected_circles
     storage['gameState']['totalCirclesDetected'] = len(detected_circles)
+    if detected_circles:
+        try:
+            frame_time = gameState.get('detectionFrameTime', absTime.seconds)
+            scriptOp.par.Detectionage = round((absTime.seconds - frame_time) * 1000, 1)
+        except:
+            pass
+    
+    if profile:
+        profileLap(profile, 'detection')
     
     # Check collisions for all detected circles
     if detected_circles:
         circle_collisions = checkCircleCollisions(
-            detected_circles, lava_intensity, safe_zone_list, tex_size, collision_threshold
+            detected_circles, lava_intensity, safe_zone_list, tex_size, collision_threshold, buffers,
+            lava_args if lava_scale > 1 else None
         )
         storage['gameState']['circleCollisions'] = circle_collisions
-        
-        # Update parameters with detection info
+    else:
+        circle_collisions = {}
+    
+    # An empty export clears the last cook's circles once everyone has left
+    if publishExport(scriptOp, params, 'circles', circleRecords(detected_circles, circle_collisions)):
         try:
             scriptOp.par.Numcirclesdetected = len(detected_circles)
-            
-            # Create simplified position list
-            positions = [{'id': c['id'], 
-                         'x': round(c['norm_x'], 3), 
-                         'y': round(c['norm_y'], 3),
-                         'px': c['pixel_x'],
-                         'py': c['pixel_y']} 
-                        for c in detected_circles]
-            scriptOp.par.Circlepositions = str(positions)
-            
-            # Create collision status
-            status = {f"circle_{cid}": {
-                'colliding': info['colliding'],
-                'safe': info['in_safe_zone']
-            } for cid, info in circle_collisions.items()}
-            scriptOp.par.Collisionstatus = str(status)
         except:
             pass
-        
+    
+    if profile:
+        profileLap(profile, 'collisions')
+    
+    if detected_circles:
         # Draw all detected circles with exact pixel mapping
         for circle in detected_circles:
             px = circle['pixel_x']
@@ -720,82 +2773,55 @@ def onCook(scriptOp):
             in_safe_zone = collision_info.get('in_safe_zone', False)
             
             # Draw circle with appropriate color based on status
-            for dy in range(-radius, radius + 1):
-                for dx in range(-radius, radius + 1):
-                    x = px + dx
-                    y = py + dy
-                    if 0 <= x < tex_size and 0 <= y < tex_size:
-                        dist = np.sqrt(dx*dx + dy*dy)
-                        if dist <= radius:
-                            intensity = 1.0 - (dist / radius) * 0.3
-                            
-                            if debug_mode:
-                                # Debug mode: show circle ID as color
-                                color_idx = circle['id'] % len(color_map)
-                                debug_color = color_map[color_idx]
-                                output[y, x, 0] = debug_color[0] * intensity
-                                output[y, x, 1] = debug_color[1] * intensity
-                                output[y, x, 2] = debug_color[2] * intensity
-                            else:
-                                if is_colliding and not in_safe_zone:
-                                    # Red glow when colliding with lava
-                                    output[y, x, 0] = 1.0 * intensity
-                                    output[y, x, 1] = 0.2 * intensity
-                                    output[y, x, 2] = 0.2 * intensity
-                                elif in_safe_zone:
-                                    # Green glow when in safe zone
-                                    output[y, x, 0] = 0.2 * intensity
-                                    output[y, x, 1] = 1.0 * intensity
-                                    output[y, x, 2] = 0.2 * intensity
-                                else:
-                                    # White when safe
-                                    output[y, x, 0] = 1.0 * intensity
-                                    output[y, x, 1] = 1.0 * intensity
-                                    output[y, x, 2] = 1.0 * intensity
+            if debug_mode:
+                # Debug mode: show circle ID as color
+                circle_color = color_map[circle['id'] % len(color_map)]
+            elif is_colliding and not in_safe_zone:
+                # Red glow when colliding with lava
+                circle_color = CIRCLE_COLLIDING_COLOR
+            elif in_safe_zone:
+                # Green glow when in safe zone
+                circle_color = CIRCLE_SAFE_COLOR
+            else:
+                # White when safe
+                circle_color = CIRCLE_CLEAR_COLOR
+            
+            drawStamp(output, px, py, radius, CIRCLE_FALLOFF, circle_color)
     
     # DRAW GAME PLAYERS (original game logic)
-    if gameState.get('isRunning', False) and 'players' in gameState:
-        for pid, player in gameState['players'].items():
-            if not player['isAlive']:
-                continue
-            
-            px = int(player['position'][0] * tex_size)
-            py = int(player['position'][1] * tex_size)
-            
-            # Get player's color
-            player_color = color_map[player['color'] % len(color_map)]
-            
-            # Draw player with bigger size
-            player_size = 8
-            for dy in range(-player_size, player_size + 1):
-                for dx in range(-player_size, player_size + 1):
-                    x = px + dx
-                    y = py + dy
-                    if 0 <= x < tex_size and 0 <= y < tex_size:
-                        dist = np.sqrt(dx*dx + dy*dy)
-                        if dist <= player_size:
-                            intensity = 1.0 - (dist / player_size) * 0.5
-                            output[y, x, 0] = player_color[0] * intensity
-                            output[y, x, 1] = player_color[1] * intensity
-                            output[y, x, 2] = player_color[2] * intensity
+    players = gameState.get('players')
+    if gameState.get('isRunning', False) and players:
+        alive = players['isAlive']
+        
+        # Get each player's color and draw them all with bigger size
+        player_colors = np.asarray(color_map)[players['color'][alive] % len(color_map)]
+        drawStamps(output, (players['position'][alive] * tex_size).astype(np.intp),
+                   PLAYER_SIZE, PLAYER_FALLOFF, player_colors, index_scratch)
     
     # Debug visualization - draw grid reference
     if debug_mode:
         # Draw crosshairs at detected positions
+        crosshair_color = pixelColor(CROSSHAIR_COLOR, output.dtype)
         for circle in detected_circles:
             px = circle['pixel_x']
             py = circle['pixel_y']
             
             # Draw crosshair
-            for i in range(-20, 21):
-                if 0 <= px + i < tex_size:
-                    output[py, px + i, 0] = 1.0
-                    output[py, px + i, 1] = 0.0
-                    output[py, px + i, 2] = 1.0
-                if 0 <= py + i < tex_size:
-                    output[py + i, px, 0] = 1.0
-                    output[py + i, px, 1] = 0.0
-                    output[py + i, px, 2] = 1.0
+            output[py, max(0, px - 20):min(tex_size, px + 21), :3] = crosshair_color
+            output[max(0, py - 20):min(tex_size, py + 21), px, :3] = crosshair_color
+    
+    if profile:
+        profileLap(profile, 'sprites')
+    
+    # Anything drawn over the base has to be erased by the next cook
+    storage['spritesDrawn'] = bool(detected_circles) or bool(gameState.get('isRunning', False) and players)
     
     scriptOp.copyNumpyArray(output)
+    
+    if params.auto_quality:
+        updateGovernor(scriptOp, (perf_counter_ns() - cook_start) / 1e6, params.frame_budget)
+    
+    if profile:
+        profileLap(profile, 'output')
+        finishProfile(profile, scriptOp)
     return
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""Parameter Execute DAT callbacks that tell fix.py a parameter changed
+
+A Script TOP's callbacks DAT only gets onSetupParameters, onPulse and
+onCook, so fix.py never hears about parameter edits itself. To apply edits
+on the next cook, add a Parameter Execute DAT beside the callbacks DAT (in
+the same COMP, so both share parent().storage) with this file as its
+contents, OPs set to the Script TOP, Parameters set to * and Value Change
+on. Without it fix.py still picks edits up, but only every
+PARAM_POLL_INTERVAL cooks.
+"""
+
+
+def onValueChange(par, prev):
+    # Read-only parameters are outputs fix.py rewrites every cook - they never dirty the snapshot
+    if par.isCustom and not par.readOnly and hasattr(parent(), 'storage'):
+        parent().storage['paramsDirty'] = True
+    return
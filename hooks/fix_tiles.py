@@ -0,0 +1,82 @@
+"""Tile workers for the tiled render mode of fix.py
+
+Each worker process loads fix.py once, with stand-ins for the TouchDesigner
+globals it touches at import time, and renders bands of rows straight into
+the shared memory frame buffers of the cooking process. Only plain NumPy
+code from fix.py runs here - no TouchDesigner objects exist in a worker.
+"""
+import numpy as np
+from multiprocessing import shared_memory
+
+fix = None  # fix.py's namespace in this worker
+segments = {}  # Attached shared memory blocks by name
+scratch = {}  # Per-worker scratch buffers by size
+
+
+class Component:
+    """parent() stand-in - fix.py keeps its storage on it"""
+
+
+class Clock:
+    """absTime stand-in - workers never look at time"""
+    seconds = 0.0
+
+
+def initWorker(script_path):
+    """Process pool initializer - load fix.py into this worker"""
+    global fix
+    component = Component()
+    namespace = {
+        '__name__': 'fix_tile_worker',
+        '__file__': script_path,
+        'parent': lambda: component,
+        'absTime': Clock(),
+    }
+    with open(script_path) as source:
+        exec(compile(source.read(), script_path, 'exec'), namespace)
+    fix = namespace
+
+
+def attach(name):
+    """Shared memory block created by the cooking process, attached once per worker"""
+    segment = segments.get(name)
+    if segment is None:
+        try:
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 - workers share the cooking process's resource
+            # tracker, which already owns the block, so registering again is harmless
+            segment = shared_memory.SharedMemory(name=name)
+        segments[name] = segment
+    return segment
+
+
+def frameArrays(names, tex_size, pixel_dtype):
+    """output, base and lava arrays over the cooking process's shared buffers"""
+    # Let go of buffers the cook has since replaced (Resolution change)
+    for name in list(segments):
+        if name not in names.values():
+            segments.pop(name).close()
+
+    output = np.ndarray((tex_size, tex_size, 4), dtype=pixel_dtype, buffer=attach(names['output']).buf)
+    base = np.ndarray((tex_size, tex_size, 4), dtype=pixel_dtype, buffer=attach(names['base']).buf)
+    lava = np.ndarray((tex_size, tex_size), dtype='float32', buffer=attach(names['lava']).buf)
+    return output, base, lava
+
+
+def bandScratch(size):
+    """float32 scratch of at least size elements, reused across jobs"""
+    buffer = scratch.get(size)
+    if buffer is None:
+        buffer = np.empty(size, dtype='float32')
+        scratch.clear()
+        scratch[size] = buffer
+    return buffer
+
+
+def renderBand(names, tex_size, pixel_dtype, band, job):
+    """Render lava, compose the base and/or blit it to the output for rows band[0]:band[1]"""
+    row0, row1 = band
+    output, base, lava = frameArrays(names, tex_size, pixel_dtype)
+    band_scratch = bandScratch(fix['fusedBandRows'](tex_size, row1 - row0) * tex_size)
+    fix['renderBands'](output, base, lava, row0, row1, job, band_scratch)
@@ -0,0 +1,278 @@
+"""Cook latency benchmark for hooks/fix.py
+
+Cooks the Script TOP through the headless harness (td_harness.py) across
+resolutions, input blob counts and effect profiles, and reports p50/p95/p99
+per-cook latency. Results go to a JSON file so runs from two commits can be
+compared:
+
+    python scripts/bench_fix.py --output before.json
+    git checkout my-branch
+    python scripts/bench_fix.py --output after.json --compare before.json
+
+Use --frames to replay recorded input (.npy / .npz) instead of synthetic blobs.
+Use --validate with --output-format float16 / uint8 to check that format
+against the float32 reference instead of timing it: both are cooked in
+lockstep on the same clock and input, and any pixel further off than
+VALIDATE_TOLERANCE fails the run.
+
+Use --fused-min-pixels to move the frame size from which lava, colour and blit
+run in fused bands - a huge value benchmarks the per-layer order, 0 always
+bands:
+
+    python scripts/bench_fix.py --resolutions 2048 --fused-min-pixels 1e12 --output layered.json
+    python scripts/bench_fix.py --resolutions 2048 --output fused.json --compare layered.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from td_harness import Harness, syntheticFrames, loadFrames
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCRIPT = os.path.join(REPO_ROOT, 'hooks', 'fix.py')
+
+DEFAULT_RESOLUTIONS = [64, 256, 512, 1024]
+DEFAULT_BLOB_COUNTS = [0, 1, 5, 20]
+
+# Parameter overrides per effect profile
+PROFILES = {
+    'full': {},
+    'scanners': {'Diagonalscan': False, 'Circularscan': False, 'Burstcount': 0},
+    'static': {'Scanspeed': 0.0, 'Scanpulse': False, 'Diagonalscan': False,
+               'Circularscan': False, 'Burstcount': 0, 'Safemove': False},
+    'game': {'Numplayers': 500},
+}
+
+# A benchmark result is flagged when p50 gets this much slower than the baseline
+REGRESSION_RATIO = 1.10
+
+# Largest allowed difference from the float32 reference, in 0-1 colour units.
+# uint8 rounds to the nearest of 255 steps; float16 keeps 11 significant bits.
+VALIDATE_TOLERANCE = {'uint8': 0.5 / 255 + 1e-6, 'float16': 1e-3}
+
+
+def gitRevision():
+    """Short commit hash of the tree being benchmarked, or None outside git"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=REPO_ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def makeHarness(script, resolution, profile, frames, output_format='float32', fused_min_pixels=None):
+    """Harness for one configuration (frames None = no input)"""
+    params = dict(PROFILES[profile], Resolution=resolution)
+    # Scripts from before Outputformat existed only render float32
+    if output_format != 'float32':
+        params['Outputformat'] = output_format
+    harness = Harness(script, params=params, frames=frames)
+    if fused_min_pixels is not None:
+        # A module constant, read at every cook - only this process, tile workers load their own copy
+        if 'FUSED_MIN_PIXELS' not in harness.namespace:
+            raise SystemExit(f"{script} has no FUSED_MIN_PIXELS to override")
+        harness.namespace['FUSED_MIN_PIXELS'] = fused_min_pixels
+    return harness
+
+
+def benchConfig(script, resolution, profile, frames, cooks, warmup, output_format='float32',
+                fused_min_pixels=None):
+    """Per-cook latencies in milliseconds for one configuration (frames None = no input)"""
+    harness = makeHarness(script, resolution, profile, frames, output_format, fused_min_pixels)
+
+    # The script prints game events - keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        if profile == 'game':
+            harness.pulse('Startgame')
+        for i in range(warmup):
+            harness.cook()
+
+        latencies = np.empty(cooks)
+        for i in range(cooks):
+            start = time.perf_counter_ns()
+            harness.cook()
+            latencies[i] = (time.perf_counter_ns() - start) / 1e6
+
+    return latencies
+
+
+def validateConfig(script, resolution, profile, frames, cooks, output_format, fused_min_pixels=None):
+    """Largest difference of output_format from the float32 reference over cooks lockstep cooks, in 0-1 units"""
+    harnesses = [makeHarness(script, resolution, profile, frames, fmt, fused_min_pixels)
+                 for fmt in ('float32', output_format)]
+    # Players move on the global NumPy generator - each harness gets its own copy of the same stream
+    np.random.seed(0)
+    states = [np.random.get_state()] * 2
+    scale = 255.0 if output_format == 'uint8' else 1.0
+
+    worst = 0.0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(cooks + 1):
+            outputs = []
+            for h, harness in enumerate(harnesses):
+                np.random.set_state(states[h])
+                if i == 0:
+                    if profile == 'game':
+                        harness.pulse('Startgame')
+                    continue
+                outputs.append(harness.cook().astype(np.float64))
+                states[h] = np.random.get_state()
+            if outputs:
+                reference, output = outputs
+                if output_format == 'uint8':
+                    # uint8 saturates where float32 overshoots 1
+                    reference = np.clip(reference, 0.0, 1.0)
+                worst = max(worst, float(np.abs(output / scale - reference).max()))
+    return worst
+
+
+def summarize(latencies):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(latencies.mean()), 4),
+        'max_ms': round(float(latencies.max()), 4),
+    }
+
+
+def configName(result):
+    return f"{result['profile']}/res{result['resolution']}/blobs{result['blobs']}"
+
+
+def loadBaseline(baseline_path, output_format):
+    """Earlier results file to compare against - refused if it rendered another output format"""
+    with open(baseline_path) as f:
+        report = json.load(f)
+    # Reports from before --output-format rendered float32
+    baseline_format = report.get('output_format', 'float32')
+    if baseline_format != output_format:
+        raise SystemExit(f"{baseline_path} rendered {baseline_format}, not {output_format} - "
+                         f"rerun with --output-format {baseline_format} to compare")
+    return report
+
+
+def compareResults(results, report, baseline_path):
+    """Print p50 ratios against an earlier run and return the number of regressions"""
+    baseline = {configName(r): r for r in report['results']}
+
+    regressions = 0
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        name = configName(result)
+        if name not in baseline:
+            continue
+        ratio = result['p50_ms'] / max(baseline[name]['p50_ms'], 1e-9)
+        flag = ''
+        if ratio > REGRESSION_RATIO:
+            flag = '  <-- slower'
+            regressions += 1
+        print(f"  {name:32s} {baseline[name]['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--script', default=DEFAULT_SCRIPT, help='callbacks DAT to cook')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=DEFAULT_RESOLUTIONS)
+    parser.add_argument('--blobs', type=int, nargs='+', default=DEFAULT_BLOB_COUNTS,
+                        help='number of synthetic input blobs (0 = no input connected)')
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--input-size', type=int, nargs=2, default=[1280, 720], metavar=('W', 'H'))
+    parser.add_argument('--frames', help='recorded input frames (.npy or .npz) instead of synthetic blobs')
+    parser.add_argument('--output-format', default='float32', choices=['float32', 'float16', 'uint8'],
+                        help='Outputformat pixel type to render')
+    parser.add_argument('--validate', action='store_true',
+                        help='check --output-format against float32 within VALIDATE_TOLERANCE instead of timing')
+    parser.add_argument('--fused-min-pixels', type=float,
+                        help='override FUSED_MIN_PIXELS (frame pixels from which rendering runs in fused bands)')
+    parser.add_argument('--cooks', type=int, default=120, help='timed cooks per configuration')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed cooks before timing')
+    parser.add_argument('--output', default='bench_fix.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results file to compare p50 against')
+    args = parser.parse_args(argv)
+
+    if args.validate and args.output_format not in VALIDATE_TOLERANCE:
+        parser.error(f"--validate needs --output-format {' or '.join(VALIDATE_TOLERANCE)}")
+    baseline = loadBaseline(args.compare, args.output_format) if args.compare else None
+
+    recorded = loadFrames(args.frames) if args.frames else None
+    blob_counts = ['recorded'] if recorded is not None else args.blobs
+
+    if args.validate:
+        return validate(args, recorded, blob_counts)
+
+    results = []
+    print(f"{'config':32s} {'p50':>9s} {'p95':>9s} {'p99':>9s}  (ms)")
+    for profile in args.profiles:
+        for num_blobs in blob_counts:
+            if recorded is not None:
+                frames = recorded
+            else:
+                frames = syntheticFrames(args.input_size[0], args.input_size[1], num_blobs) if num_blobs else None
+            for resolution in args.resolutions:
+                latencies = benchConfig(args.script, resolution, profile, frames, args.cooks, args.warmup,
+                                        args.output_format, args.fused_min_pixels)
+                result = {'profile': profile, 'resolution': resolution, 'blobs': num_blobs}
+                result.update(summarize(latencies))
+                results.append(result)
+                print(f"{configName(result):32s} {result['p50_ms']:9.3f} {result['p95_ms']:9.3f} {result['p99_ms']:9.3f}")
+
+    report = {
+        'script': os.path.relpath(args.script, REPO_ROOT),
+        'revision': gitRevision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.platform(),
+        'cooks': args.cooks,
+        'warmup': args.warmup,
+        'output_format': args.output_format,
+        'fused_min_pixels': args.fused_min_pixels,
+        'input': args.frames or f"synthetic {args.input_size[0]}x{args.input_size[1]}",
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        return 1 if compareResults(results, baseline, args.compare) else 0
+    return 0
+
+
+def validate(args, recorded, blob_counts):
+    """--validate: report each configuration's worst difference from float32, 1 if any is over tolerance"""
+    tolerance = VALIDATE_TOLERANCE[args.output_format]
+    failures = 0
+    print(f"{'config':32s} {'max diff':>10s}  ({args.output_format} vs float32, tolerance {tolerance:.2e})")
+    for profile in args.profiles:
+        for num_blobs in blob_counts:
+            if recorded is not None:
+                frames = recorded
+            else:
+                frames = syntheticFrames(args.input_size[0], args.input_size[1], num_blobs) if num_blobs else None
+            for resolution in args.resolutions:
+                worst = validateConfig(args.script, resolution, profile, frames, args.cooks,
+                                       args.output_format, args.fused_min_pixels)
+                name = configName({'profile': profile, 'resolution': resolution, 'blobs': num_blobs})
+                flag = ''
+                if worst > tolerance:
+                    flag = '  <-- over tolerance'
+                    failures += 1
+                print(f"{name:32s} {worst:10.2e}{flag}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""Headless stand-in for the TouchDesigner objects hooks/fix.py uses
+
+fix.py is a Script TOP callbacks DAT: it reaches for parent(), absTime,
+scriptOp.par, scriptOp.inputs[0].numpyArray() and scriptOp.copyNumpyArray(),
+which only exist inside TouchDesigner. This module fakes just enough of them
+to cook the script from plain Python, so it can be profiled and benchmarked
+outside TouchDesigner.
+
+    from td_harness import Harness, syntheticFrames
+
+    harness = Harness('hooks/fix.py', params={'Resolution': 512},
+                      frames=syntheticFrames(1280, 720, num_blobs=5))
+    harness.pulse('Startgame')
+    output = harness.cook()
+
+Parameters and their defaults come from the script's own onSetupParameters,
+so the harness never drifts from the real parameter list.
+
+Like a Script TOP, the script itself hears nothing when a parameter changes.
+Pass par_exec (e.g. 'hooks/fix_parexec.py') to load a Parameter Execute
+DAT's callbacks and fire its onValueChange on every change; without it
+only the script's own fallback polling picks changes up.
+"""
+import os
+
+import numpy as np
+
+
+class Par:
+    """One custom parameter - value plus the attributes onSetupParameters sets"""
+
+    def __init__(self, owner, name, style, label=None):
+        self.owner = owner
+        self.name = name
+        self.style = style
+        self.label = label or name
+        self.val = None
+        self.min = None
+        self.max = None
+        self.readOnly = False
+        self.isCustom = True
+        self.menuNames = []
+        self.menuLabels = []
+        self._default = None
+
+    @property
+    def default(self):
+        return self._default
+
+    @default.setter
+    def default(self, value):
+        # Like TouchDesigner, a freshly created parameter starts at its default
+        self._default = value
+        self.val = value
+
+    def eval(self):
+        return self.val
+
+    def __repr__(self):
+        return f"Par({self.name}={self.val!r})"
+
+
+class ParCollection:
+    """scriptOp.par - attribute access to Par objects, assignment sets their value"""
+
+    def __init__(self):
+        object.__setattr__(self, '_pars', {})
+
+    def __getattr__(self, name):
+        pars = object.__getattribute__(self, '_pars')
+        if name not in pars:
+            raise AttributeError(f"No parameter named '{name}'")
+        return pars[name]
+
+    def __setattr__(self, name, value):
+        self.__getattr__(name).val = value
+
+    def __iter__(self):
+        return iter(object.__getattribute__(self, '_pars').values())
+
+    def add(self, par):
+        object.__getattribute__(self, '_pars')[par.name] = par
+        return par
+
+
+class Page:
+    """Custom parameter page - each appendX creates one Par"""
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        self.pars = []
+
+    def _append(self, name, style, label):
+        par = self.owner.par.add(Par(self.owner, name, style, label))
+        self.pars.append(par)
+        return par
+
+    def appendFloat(self, name, label=None):
+        return self._append(name, 'Float', label)
+
+    def appendInt(self, name, label=None):
+        return self._append(name, 'Int', label)
+
+    def appendToggle(self, name, label=None):
+        return self._append(name, 'Toggle', label)
+
+    def appendStr(self, name, label=None):
+        return self._append(name, 'Str', label)
+
+    def appendMenu(self, name, label=None):
+        return self._append(name, 'Menu', label)
+
+    def appendPulse(self, name, label=None):
+        return self._append(name, 'Pulse', label)
+
+    def appendDAT(self, name, label=None):
+        return self._append(name, 'DAT', label)
+
+
+class TableDAT:
+    """Table DAT a DAT parameter can point at - rows of strings"""
+
+    def __init__(self, name='table1'):
+        self.name = name
+        self.rows = []
+
+    def clear(self):
+        self.rows = []
+
+    def appendRow(self, cells):
+        self.rows.append([str(cell) for cell in cells])
+
+
+class InputTop:
+    """Input TOP that plays back a list of frames, one per cook"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+
+    @property
+    def width(self):
+        return self.frames[self.index].shape[1]
+
+    @property
+    def height(self):
+        return self.frames[self.index].shape[0]
+
+    def numpyArray(self):
+        return self.frames[self.index]
+
+    def advance(self):
+        self.index = (self.index + 1) % len(self.frames)
+
+
+class ScriptOp:
+    """The Script TOP passed to every callback"""
+
+    def __init__(self, name='script1'):
+        self.name = name
+        self.par = ParCollection()
+        self.pages = []
+        self.inputs = []
+        self.output = None
+
+    def appendCustomPage(self, name):
+        page = Page(self, name)
+        self.pages.append(page)
+        return page
+
+    def copyNumpyArray(self, array):
+        # TouchDesigner copies the array into the TOP - keep one buffer and copy into it
+        if self.output is None or self.output.shape != array.shape or self.output.dtype != array.dtype:
+            self.output = np.empty_like(array)
+        np.copyto(self.output, array)
+
+
+class Component:
+    """parent() - only ever used for its storage attribute"""
+
+
+class Clock:
+    """absTime - seconds is set by the harness before every cook"""
+    seconds = 0.0
+
+
+class Harness:
+    """Loads a callbacks DAT into its own namespace and cooks it like a Script TOP would"""
+
+    def __init__(self, script_path, params=None, frames=None, fps=60.0, start_time=1.0, par_exec=None):
+        self.script_path = os.path.abspath(script_path)
+        self.fps = fps
+        self.clock = Clock()
+        self.clock.seconds = start_time
+        self.component = Component()
+        self.scriptOp = ScriptOp()
+        if frames is not None:
+            self.scriptOp.inputs.append(InputTop(frames))
+
+        with open(self.script_path) as source:
+            code = compile(source.read(), self.script_path, 'exec')
+        self.namespace = {
+            '__name__': os.path.splitext(os.path.basename(self.script_path))[0],
+            '__file__': self.script_path,
+            'parent': lambda: self.component,
+            'absTime': self.clock,
+        }
+        exec(code, self.namespace)
+        self.par_exec = self.load(par_exec) if par_exec else None
+
+        self.callback('onSetupParameters', self.scriptOp)
+        for name, value in (params or {}).items():
+            self.setPar(name, value)
+
+    def load(self, path):
+        """Namespace of another DAT in the same component - shares parent() and absTime with the script"""
+        path = os.path.abspath(path)
+        with open(path) as source:
+            code = compile(source.read(), path, 'exec')
+        namespace = {
+            '__name__': os.path.splitext(os.path.basename(path))[0],
+            '__file__': path,
+            'parent': lambda: self.component,
+            'absTime': self.clock,
+        }
+        exec(code, namespace)
+        return namespace
+
+    @property
+    def storage(self):
+        return self.component.storage
+
+    def callback(self, name, *args):
+        """Call a callback if the script defines it"""
+        function = self.namespace.get(name)
+        if function is None:
+            return None
+        return function(*args)
+
+    def setPar(self, name, value):
+        """Change a parameter and notify the Parameter Execute DAT, if there is one, the way TouchDesigner would"""
+        par = getattr(self.scriptOp.par, name)
+        previous = par.val
+        par.val = value
+        if previous != value and self.par_exec is not None:
+            self.par_exec['onValueChange'](par, previous)
+
+    def pulse(self, name):
+        """Press a pulse parameter"""
+        self.callback('onPulse', getattr(self.scriptOp.par, name))
+
+    def cook(self, advance=True):
+        """Cook once and return the output array; time and input move on by one frame"""
+        self.callback('onCook', self.scriptOp)
+        if advance:
+            self.clock.seconds += 1.0 / self.fps
+            for top in self.scriptOp.inputs:
+                top.advance()
+        return self.scriptOp.output
+
+
+def syntheticFrames(width, height, num_blobs, num_frames=32, radius=None, speed=4.0, seed=0):
+    """White discs drifting over black, as float32 RGBA frames like a TOP's numpyArray()
+
+    Discs bounce around the frame at speed pixels per frame, so consecutive
+    frames look like a camera watching people move.
+    """
+    rng = np.random.default_rng(seed)
+    if radius is None:
+        radius = max(4, min(width, height) // 30)
+
+    position = rng.uniform([radius, radius], [width - radius, height - radius], (num_blobs, 2))
+    angle = rng.uniform(0, 2 * np.pi, num_blobs)
+    velocity = np.stack([np.cos(angle), np.sin(angle)], axis=1) * speed
+    low = np.array([radius, radius])
+    high = np.array([width - radius, height - radius])
+
+    yy, xx = np.ogrid[:height, :width]
+    frames = []
+    for i in range(num_frames):
+        frame = np.zeros((height, width, 4), dtype=np.float32)
+        frame[:, :, 3] = 1.0
+        for x, y in position:
+            frame[(xx - x) ** 2 + (yy - y) ** 2 <= radius * radius, :3] = 1.0
+        frames.append(frame)
+
+        position += velocity
+        bounced = (position < low) | (position > high)
+        velocity[bounced] *= -1
+        np.clip(position, low, high, out=position)
+
+    return frames
+
+
+def loadFrames(path):
+    """Recorded input frames from .npy (one HxWxC frame or an NxHxWxC stack) or .npz (one frame per array)"""
+    if path.endswith('.npz'):
+        with np.load(path) as archive:
+            frames = [archive[key] for key in sorted(archive.files)]
+    else:
+        stack = np.load(path)
+        frames = [stack] if stack.ndim == 3 else list(stack)
+
+    # TOPs hand out float32 RGBA
+    converted = []
+    for frame in frames:
+        frame = np.asarray(frame, dtype=np.float32)
+        if frame.shape[2] == 3:
+            frame = np.concatenate([frame, np.ones(frame.shape[:2] + (1,), np.float32)], axis=2)
+        converted.append(np.ascontiguousarray(frame))
+    return converted